@@ -0,0 +1,74 @@
+# FILE: aggregates.py
+
+import pandas as pd
+from money import amount_cents, to_dollars
+
+CUBE_LEVELS = ['Month', 'Category', 'Description']
+MEASURES = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'}
+GRANULARITIES = {'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+DIMENSIONS = {'total': [], 'category': ['Category'], 'merchant': ['Category', 'Description']}
+
+_cube = None
+
+class AggregateCube:
+    # Month x category x merchant cells with sum/count/min/max of Amount in integer cents, plus the rows behind each
+    # month x category cell for top-transaction lookups
+
+    def __init__(self, cells, data):
+        self.cells = cells
+        self.data = data
+        self._rows = None
+
+    def monthly_spending(self):
+        # Same shape as groupby([month, 'Category'])['Amount'].sum().unstack(), read from the cube
+        sums = self.cells['sum'].groupby(level=['Month', 'Category'], observed=True).sum()
+        monthly_spending_data = to_dollars(sums).unstack()
+        monthly_spending_data.index = monthly_spending_data.index.astype(str)  # Convert Period to string
+        return monthly_spending_data
+
+    def rollup(self, granularity='month', by='category'):
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity '{granularity}'")
+        if by not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension '{by}'")
+        cells = self.cells.reset_index()
+        cells['Period'] = pd.PeriodIndex(cells['Month']).asfreq(GRANULARITIES[granularity]).astype(str)
+        keys = ['Period'] + DIMENSIONS[by]
+        rollup = cells.groupby(keys, observed=True, dropna=False).agg(MEASURES).reset_index()
+        return rollup.assign(**{measure: to_dollars(rollup[measure]) for measure in ['sum', 'min', 'max']})
+
+    def top_transactions(self, month, category, n=10):
+        # Most negative transactions of one month x category cell without scanning the whole frame
+        if self._rows is None:
+            months = self.data['date'].dt.to_period('M').astype(str)
+            self._rows = self.data.groupby([months, 'Category'], observed=True).indices
+        rows = self._rows.get((month, category))
+        if rows is None:
+            return self.data.iloc[0:0]
+        return self.data.iloc[rows].nsmallest(n, 'Amount')
+
+def cube_cells(data):
+    # Rows without a date or category are kept here and only dropped from the month x category views
+    months = data['date'].dt.to_period('M').rename('Month')
+    keys = [months, data['Category'], data['Description']]
+    return amount_cents(data).groupby(keys, observed=True, dropna=False).agg(['sum', 'count', 'min', 'max'])
+
+def merge_cells(cells, new_cells):
+    # Fold newly ingested cells into existing ones without revisiting older rows
+    if cells is None or cells.empty:
+        return new_cells
+    if new_cells.empty:
+        return cells
+    combined = pd.concat([cells, new_cells])
+    return combined.groupby(level=CUBE_LEVELS, observed=True, dropna=False).agg(MEASURES)
+
+def build_cube(data, cells=None):
+    global _cube
+    _cube = AggregateCube(cube_cells(data) if cells is None else cells, data)
+    return _cube
+
+def get_cube(data):
+    # The cube registered for this cleaned dataset, rebuilding it only for a different dataset
+    if _cube is None or _cube.data is not data:
+        return build_cube(data)
+    return _cube
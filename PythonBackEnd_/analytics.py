@@ -4,11 +4,14 @@ import pandas as pd
 from utils import standardize_descriptions
 
 def calculate_z_scores(data):
-    data['Z-Score'] = data.groupby('Category')['Amount'].transform(lambda x: (x - x.mean()) / x.std())
-    return data
+    # Built-in group reductions instead of a Python lambda per group; returns a new frame and leaves data untouched
+    grouped = data.groupby('Category', observed=True)['Amount']
+    z_scores = (data['Amount'] - grouped.transform('mean')) / grouped.transform('std')
+    return data.assign(**{'Z-Score': z_scores})
 
 def identify_unique_spend_patterns(data, z_score_threshold=3):
-    data = calculate_z_scores(data)
+    if 'Z-Score' not in data.columns:
+        data = calculate_z_scores(data)
     unique_spend_patterns = data[data['Z-Score'].abs() > z_score_threshold]
     unique_spend_patterns = unique_spend_patterns.sort_values(by='Z-Score', ascending=True)
     return unique_spend_patterns
@@ -0,0 +1,170 @@
+# FILE: anomaly.py
+
+import math
+from collections import defaultdict
+import pandas as pd
+from mappings import CATEGORY_MAPPING
+
+DEFAULT_Z_THRESHOLD = 3
+# Fitted detectors kept per dataset, one per (alpha, window_months) requested
+MAX_DETECTORS = 8
+
+_detectors = None
+
+class RunningStats:
+    # Welford's online mean/variance: O(1) per added value, and two summaries can be merged
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        # Chan et al. parallel combination of two partial summaries
+        if other.count == 0:
+            return RunningStats(self.count, self.mean, self.m2)
+        if self.count == 0:
+            return RunningStats(other.count, other.mean, other.m2)
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        mean = self.mean + delta * other.count / count
+        m2 = self.m2 + other.m2 + delta * delta * self.count * other.count / count
+        return RunningStats(count, mean, m2)
+
+    @property
+    def std(self):
+        # Sample standard deviation, matching pandas' std (ddof=1)
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else float('nan')
+
+class EwmStats:
+    # Exponentially weighted mean/variance, so recent spending counts more than old history
+
+    __slots__ = ('alpha', 'count', 'mean', 'var')
+
+    def __init__(self, alpha, count=0, mean=0.0, var=0.0):
+        self.alpha = alpha
+        self.count = count
+        self.mean = mean
+        self.var = var
+
+    def add(self, value):
+        self.count += 1
+        if self.count == 1:
+            self.mean, self.var = value, 0.0
+            return
+        delta = value - self.mean
+        self.mean += self.alpha * delta
+        self.var = (1 - self.alpha) * (self.var + self.alpha * delta * delta)
+
+    @property
+    def std(self):
+        return math.sqrt(self.var) if self.count > 1 else float('nan')
+
+class AnomalyDetector:
+    # Per-category running statistics for scoring single transactions as they arrive.
+    # By default statistics cover all history; alpha switches to exponential weighting and
+    # window_months limits them to the most recent months
+
+    def __init__(self, threshold=DEFAULT_Z_THRESHOLD, alpha=None, window_months=None):
+        self.threshold = threshold
+        self.alpha = alpha
+        self.window_months = window_months
+        self.stats = {}
+        self.monthly = defaultdict(dict)
+
+    def fit(self, data):
+        # Seed the running statistics from history with grouped reductions instead of a per-row loop
+        data = data.dropna(subset=['Category', 'Amount'])
+        months = data['date'].dt.to_period('M')
+        if self.alpha is not None:
+            ordered = data.sort_values('date', kind='stable')
+            grouped = ordered.groupby('Category', observed=True)['Amount']
+            ewm = grouped.ewm(alpha=self.alpha, adjust=False)
+            last_mean = ewm.mean().groupby(level=0, observed=True).last()
+            last_var = ewm.var(bias=True).groupby(level=0, observed=True).last()
+            counts = grouped.count()
+            for category, count in counts.items():
+                self.stats[str(category)] = EwmStats(self.alpha, int(count), float(last_mean[category]), float(last_var[category]))
+        elif self.window_months is not None:
+            summary = data['Amount'].groupby([data['Category'], months], observed=True).agg(['count', 'mean', 'var'])
+            for (category, month), row in summary.iterrows():
+                self.monthly[str(category)][month] = summary_stats(row)
+        else:
+            summary = data.groupby('Category', observed=True)['Amount'].agg(['count', 'mean', 'var'])
+            for category, row in summary.iterrows():
+                self.stats[str(category)] = summary_stats(row)
+        return self
+
+    def stats_for(self, category, month=None):
+        if self.window_months is None:
+            return self.stats.get(category)
+        months = self.monthly.get(category)
+        if not months:
+            return None
+        month = month or max(months)
+        combined = RunningStats()
+        for offset in range(self.window_months):
+            combined = combined.merge(months.get(month - offset, RunningStats()))
+        return combined
+
+    def score(self, category, amount, date=None):
+        # z-score of one transaction against its category's statistics, without changing them
+        category = normalize_category(category)
+        month = pd.Timestamp(date).to_period('M') if date else None
+        stats = self.stats_for(category, month)
+        if stats is None or not stats.std or math.isnan(stats.std):
+            z_score = None
+        else:
+            z_score = (amount - stats.mean) / stats.std
+        return {
+            'category': category,
+            'amount': amount,
+            'z_score': z_score,
+            'mean': None if stats is None else stats.mean,
+            'std': None if stats is None or math.isnan(stats.std) else stats.std,
+            'count': 0 if stats is None else stats.count,
+            'is_anomaly': z_score is not None and abs(z_score) > self.threshold
+        }
+
+    def update(self, category, amount, date=None):
+        # Fold a new transaction into the statistics in O(1). Not thread-safe: for a caller that owns its
+        # detector, not the shared ones get_detector returns
+        category = normalize_category(category)
+        if self.window_months is not None:
+            month = pd.Timestamp(date).to_period('M') if date else pd.Timestamp.now().to_period('M')
+            self.monthly[category].setdefault(month, RunningStats()).add(amount)
+        elif category in self.stats:
+            self.stats[category].add(amount)
+        else:
+            self.stats[category] = EwmStats(self.alpha) if self.alpha is not None else RunningStats()
+            self.stats[category].add(amount)
+
+def summary_stats(row):
+    count = int(row['count'])
+    m2 = 0.0 if count < 2 else float(row['var']) * (count - 1)
+    return RunningStats(count, float(row['mean']), m2)
+
+def normalize_category(category):
+    category = str(category).strip().lower()
+    return CATEGORY_MAPPING.get(category, category)
+
+def get_detector(data, alpha=None, window_months=None):
+    # One detector per cleaned dataset and statistics options, fitted on first use
+    global _detectors
+    if _detectors is None or _detectors[0] is not data:
+        _detectors = (data, {})
+    detectors = _detectors[1]
+    key = (alpha, window_months)
+    if key not in detectors:
+        while len(detectors) >= MAX_DETECTORS:
+            detectors.pop(next(iter(detectors)))
+        detectors[key] = AnomalyDetector(alpha=alpha, window_months=window_months).fit(data)
+    return detectors[key]
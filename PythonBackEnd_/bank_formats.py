@@ -0,0 +1,72 @@
+# FILE: bank_formats.py
+
+import csv
+import io
+
+class BankFormat:
+    # One bank export layout: how to recognize its header and which typed columns the pipeline reads from it
+
+    def __init__(self, name, signature, columns, dtypes, date_format=None):
+        self.name = name
+        self.signature = signature      # Header columns that identify the layout
+        self.columns = columns          # Source column -> pipeline column ('Transaction Date', 'Description', ...)
+        self.dtypes = dtypes            # Source column -> dtype passed to read_csv
+        self.date_format = date_format  # Tried first when parsing dates
+
+    def matches(self, header):
+        return all(column in header for column in self.signature)
+
+    def read_kwargs(self, header):
+        # Only load the columns this layout maps, with their declared dtypes
+        usecols = [column for column in header if column in self.columns]
+        return {
+            'usecols': usecols,
+            'dtype': {column: dtype for column, dtype in self.dtypes.items() if column in usecols}
+        }
+
+    def rename_map(self):
+        return {source: target for source, target in self.columns.items() if source != target}
+
+FORMATS = []
+
+def register_format(bank_format):
+    # Formats are tried in registration order, so register more specific signatures first
+    FORMATS.append(bank_format)
+    return bank_format
+
+def detect_format(header):
+    for bank_format in FORMATS:
+        if bank_format.matches(header):
+            return bank_format
+    return None
+
+def read_header(source):
+    # Column names from the first line only, without loading the rest of the file
+    if isinstance(source, bytes):
+        line = source.split(b'\n', 1)[0].decode('utf-8-sig')
+    else:
+        with open(source, encoding='utf-8-sig', newline='') as f:
+            line = f.readline()
+    return next(csv.reader(io.StringIO(line)), [])
+
+def sniff_format(source):
+    header = read_header(source)
+    return detect_format(header), header
+
+# Checking account export ("Details,Posting Date,Description,Amount,Type,Balance,Check or Slip #")
+register_format(BankFormat(
+    name='checking',
+    signature=['Posting Date', 'Description', 'Amount'],
+    columns={'Posting Date': 'Transaction Date', 'Description': 'Description', 'Amount': 'Amount'},
+    dtypes={'Posting Date': 'str', 'Description': 'category', 'Amount': 'float64'},
+    date_format='%m/%d/%Y'
+))
+
+# Credit card export ("Transaction Date,Post Date,Description,Category,Type,Amount,Memo")
+register_format(BankFormat(
+    name='credit_card',
+    signature=['Transaction Date', 'Description', 'Amount'],
+    columns={'Transaction Date': 'Transaction Date', 'Description': 'Description', 'Category': 'Category', 'Amount': 'Amount'},
+    dtypes={'Transaction Date': 'str', 'Description': 'category', 'Category': 'category', 'Amount': 'float64'},
+    date_format='%m/%d/%Y'
+))
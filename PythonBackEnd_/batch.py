@@ -0,0 +1,106 @@
+# FILE: batch.py
+# Usage: python batch.py manifest.json results_dir [--workers N]
+# The manifest maps account ids to their statement files: {"household-1": ["a.csv", "b.csv"], ...}
+
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+
+ACCOUNT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+$')
+REPORT_FILE = 'report.json'
+MAX_LOADED_ACCOUNTS = 32
+
+_loaded = OrderedDict()
+
+logger = logging.getLogger(__name__)
+
+def result_path(results_dir, account_id):
+    if not ACCOUNT_ID_PATTERN.match(account_id):
+        raise ValueError(f"Invalid account id '{account_id}'")
+    return os.path.join(results_dir, f"{account_id}.pkl")
+
+def run_account(account_id, file_paths, results_dir):
+    # Runs in a worker process: the full analysis for one account, written to results_dir
+    from main import main
+
+    start = time.perf_counter()
+    try:
+        result = main(file_paths)
+        data = result[0]
+        path = result_path(results_dir, account_id)
+        pd.to_pickle(result, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        rows = 0 if data is None else len(data)
+        error = None if data is not None else 'No data was read'
+    except Exception as e:
+        rows, error = 0, str(e)
+    return account_id, rows, time.perf_counter() - start, error
+
+def run_batch(manifest, results_dir, workers=None):
+    os.makedirs(results_dir, exist_ok=True)
+    start = time.perf_counter()
+    accounts = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_account, account_id, file_paths, results_dir) for account_id, file_paths in manifest.items()]
+        for future in as_completed(futures):
+            account_id, rows, seconds, error = future.result()
+            accounts[account_id] = {'rows': rows, 'seconds': round(seconds, 4), 'error': error}
+            logger.info("%s: %d rows in %.2fs%s", account_id, rows, seconds, f" ({error})" if error else "")
+    elapsed = time.perf_counter() - start
+
+    total_rows = sum(account['rows'] for account in accounts.values())
+    report = {
+        'accounts': len(accounts),
+        'failed': sorted(account_id for account_id, account in accounts.items() if account['error']),
+        'rows': total_rows,
+        'seconds': round(elapsed, 4),
+        'accounts_per_second': round(len(accounts) / elapsed, 2) if elapsed else None,
+        'rows_per_second': round(total_rows / elapsed, 2) if elapsed else None,
+        'workers': workers or os.cpu_count(),
+        'per_account': accounts
+    }
+    with open(os.path.join(results_dir, REPORT_FILE), 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+def list_accounts(results_dir):
+    return sorted(name[:-len('.pkl')] for name in os.listdir(results_dir) if name.endswith('.pkl'))
+
+def load_account_result(results_dir, account_id):
+    # Precomputed (data, monthly_spending_data, outlier_months, summary), reloaded only when rewritten
+    path = result_path(results_dir, account_id)
+    if not os.path.exists(path):
+        return None
+    mtime_ns = os.stat(path).st_mtime_ns
+    loaded = _loaded.get(path)
+    if loaded is not None and loaded[0] == mtime_ns:
+        _loaded.move_to_end(path)
+        return loaded[1]
+    result = pd.read_pickle(path)
+    _loaded[path] = (mtime_ns, result)
+    while len(_loaded) > MAX_LOADED_ACCOUNTS:
+        _loaded.popitem(last=False)
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze many accounts' statements in parallel.")
+    parser.add_argument('manifest', help="JSON file mapping account ids to lists of statement files")
+    parser.add_argument('results_dir', help="Directory for per-account results and the throughput report")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    from instrumentation import configure_logging
+    configure_logging('INFO')  # Per-account progress
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    for account_id in manifest:
+        result_path(args.results_dir, account_id)  # Reject unusable account ids before starting workers
+    report = run_batch(manifest, args.results_dir, args.workers)
+    print(f"{report['accounts']} accounts, {report['rows']} rows in {report['seconds']:.2f}s: "
+          f"{report['accounts_per_second']} accounts/s, {report['rows_per_second']} rows/s")
@@ -0,0 +1,83 @@
+# FILE: benchmarks/bench_clustering.py
+# Run from PythonBackEnd_ with: python -m benchmarks.bench_clustering [merchants] [variants]
+
+import string
+import sys
+import time
+import numpy as np
+import pandas as pd
+from clustering import cluster_descriptions, cluster_merchants
+from data_processing import determine_recurring_charges
+
+SUFFIXES = [' inc', ' llc', '.com', ' ca', ' ny', ' tx', ' store', ' online']
+
+def merchant_name(rng):
+    letters = np.array(list(string.ascii_lowercase))
+    return ' '.join(''.join(rng.choice(letters, int(rng.integers(4, 9)))) for _ in range(int(rng.integers(2, 4))))
+
+def variant(name, rng):
+    # The kind of drift bank exports show for one merchant: a suffix, a dropped or doubled character
+    kind = int(rng.integers(0, 3))
+    if kind == 0:
+        return name + SUFFIXES[int(rng.integers(0, len(SUFFIXES)))]
+    position = int(rng.integers(1, len(name) - 1))
+    if kind == 1:
+        return name[:position] + name[position + 1:]
+    return name[:position] + name[position] + name[position:]
+
+def synthetic_merchants(merchants, variants, seed=0):
+    # Distinct descriptions with the merchant each was derived from
+    rng = np.random.default_rng(seed)
+    descriptions = {}
+    for merchant in range(merchants):
+        name = merchant_name(rng)
+        descriptions.setdefault(name, merchant)
+        for _ in range(int(rng.integers(0, variants + 1))):
+            descriptions.setdefault(variant(name, rng), merchant)
+    return list(descriptions), np.array(list(descriptions.values()))
+
+def pair_scores(labels, truth):
+    # Pairwise precision and recall of the clustering against the merchants the descriptions came from
+    def same_pairs(counts):
+        return int((counts * (counts - 1) // 2).sum())
+    both = same_pairs(pd.Series(list(zip(labels, truth))).value_counts().to_numpy())
+    predicted = same_pairs(np.bincount(labels))
+    actual = same_pairs(np.bincount(truth))
+    return both / predicted if predicted else 1.0, both / actual if actual else 1.0
+
+def drifting_subscriptions(descriptions, truth, count, seed=0):
+    # Monthly subscriptions billed under a different variant of the merchant's description each month
+    rng = np.random.default_rng(seed)
+    variants = pd.Series(descriptions).groupby(truth).agg(list)
+    variants = variants[variants.map(len) > 1]
+    frames = []
+    for merchant in rng.choice(variants.index, size=min(count, len(variants)), replace=False):
+        periods = int(rng.integers(6, 25))
+        frames.append(pd.DataFrame({
+            'date': pd.date_range('2020-01-05', periods=periods, freq=pd.DateOffset(months=1)),
+            'Description': rng.choice(variants[merchant], periods),
+            'Amount': -round(float(rng.uniform(5, 100)), 2)
+        }))
+    return pd.concat(frames, ignore_index=True), len(frames)
+
+def run(merchants, variants):
+    descriptions, truth = synthetic_merchants(merchants, variants)
+    print(f"{len(descriptions)} distinct descriptions from {merchants} merchants")
+
+    start = time.perf_counter()
+    labels = cluster_descriptions(descriptions)
+    seconds = time.perf_counter() - start
+    precision, recall = pair_scores(labels, truth)
+    print(f"clustering: {seconds:.3f}s, {len(np.unique(labels))} clusters")
+    print(f"pairwise precision {precision:.3f}, recall {recall:.3f}")
+
+    data, subscriptions = drifting_subscriptions(descriptions, truth, 1000)
+    exact = determine_recurring_charges(data.copy())
+    clustered = determine_recurring_charges(data.copy(), cluster_merchants(data['Description']))
+    print(f"drifting subscriptions found: {len(exact)} exact, {len(clustered)} clustered, of {subscriptions}")
+    return seconds
+
+if __name__ == "__main__":
+    merchants = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    variants = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    run(merchants, variants)
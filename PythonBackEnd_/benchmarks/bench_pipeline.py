@@ -0,0 +1,162 @@
+# FILE: benchmarks/bench_pipeline.py
+# Run from PythonBackEnd_ with: python -m benchmarks.bench_pipeline [--sizes 1k,10k,100k,1M,10M] [--baseline FILE] [--save-baseline FILE]
+# Each size is run twice: once for wall-clock times, once under tracemalloc for per-stage peak memory
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmarks.synthetic import generate_statements, CARD_FILE, CHECKING_FILE
+
+DEFAULT_SIZES = '1k,10k,100k'
+DEFAULT_TOLERANCE = 0.25  # A stage regresses when it is this much slower than the baseline
+MIN_REGRESSION_SECONDS = 0.005  # ...and by at least this much, so millisecond noise on small sizes is ignored
+SUFFIXES = {'k': 1000, 'm': 1000000}
+
+def parse_size(size):
+    size = size.strip().lower()
+    if size[-1] in SUFFIXES:
+        return int(float(size[:-1]) * SUFFIXES[size[-1]])
+    return int(size)
+
+def statement_files(data_dir, rows):
+    # Generated files are kept per size so repeated runs skip regeneration
+    directory = os.path.join(data_dir, str(rows))
+    paths = [os.path.join(directory, CARD_FILE), os.path.join(directory, CHECKING_FILE)]
+    if not all(os.path.exists(path) for path in paths):
+        generate_statements(directory, rows)
+    return paths
+
+def remove_statement_caches(paths):
+    from statement_cache import cache_path
+    for path in paths:
+        if os.path.exists(cache_path(path)):
+            os.remove(cache_path(path))
+
+class StageTimer:
+    # Records seconds and, when tracing, peak traced memory for each stage of one pipeline run
+
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    def run(self, stage, function, *args):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = function(*args)
+        seconds = time.perf_counter() - start
+        self.stages[stage] = {'seconds': seconds}
+        if self.trace_memory:
+            self.stages[stage]['peak_mb'] = (tracemalloc.get_traced_memory()[1] - baseline) / 1e6
+        return result
+
+def run_pipeline(paths, trace_memory=False):
+    # The same stages, in the same order, as main() and the /api/data route
+    import main as app_module
+    from utils import read_and_prepare_data
+    from data_processing import clean_data, determine_recurring_charges, analyze_recurring_charges
+    from analytics import calculate_z_scores, identify_unique_spend_patterns
+    from categorization import categorize_transactions
+    from clustering import cluster_merchants
+    from aggregates import build_cube
+    from outliers import detect_outlier_months
+    from cache import clear_cache
+
+    timer = StageTimer(trace_memory)
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        remove_statement_caches(paths)
+        raw = timer.run('read_and_prepare_data (cold)', read_and_prepare_data, paths)
+        raw = timer.run('read_and_prepare_data (cached)', read_and_prepare_data, paths)
+        data = timer.run('clean_data', clean_data, raw)
+        data = timer.run('categorize_transactions', categorize_transactions, data)
+        clusters = timer.run('cluster_merchants', cluster_merchants, data['Description'])
+        recurring_charges = timer.run('determine_recurring_charges', determine_recurring_charges, data, clusters)
+        timer.run('analyze_recurring_charges', analyze_recurring_charges, recurring_charges, data)
+        data = timer.run('calculate_z_scores', calculate_z_scores, data)
+        timer.run('identify_unique_spend_patterns', identify_unique_spend_patterns, data)
+        monthly_spending_data = timer.run('monthly_spending', lambda: build_cube(data).monthly_spending())
+        timer.run('detect_outlier_months', detect_outlier_months, monthly_spending_data)
+
+        app_module.file_paths = paths
+        clear_cache()
+        client = app_module.app.test_client()
+        response = timer.run('main (end to end)', client.get, '/api/data')
+        response = timer.run('/api/data (cached result)', client.get, '/api/data')
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/data returned {response.status_code}")
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return len(raw), timer.stages
+
+def benchmark_size(data_dir, rows, memory=True):
+    paths = statement_files(data_dir, rows)
+    transactions, stages = run_pipeline(paths)
+    if memory:
+        _, traced = run_pipeline(paths, trace_memory=True)
+        for stage, measured in traced.items():
+            stages[stage]['peak_mb'] = round(measured['peak_mb'], 2)
+    for measured in stages.values():
+        measured['rows_per_second'] = round(transactions / measured['seconds'], 1) if measured['seconds'] else None
+        measured['seconds'] = round(measured['seconds'], 5)
+    return {'transactions': transactions, 'stages': stages}
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    # Stages slower than the baseline by more than the tolerance, as (size, stage, baseline s, current s)
+    regressions = []
+    for size, result in results.items():
+        baseline_stages = baseline.get(size, {}).get('stages', {})
+        for stage, measured in result['stages'].items():
+            previous = baseline_stages.get(stage)
+            if previous and measured['seconds'] > max(previous['seconds'] * (1 + tolerance), previous['seconds'] + MIN_REGRESSION_SECONDS):
+                regressions.append((size, stage, previous['seconds'], measured['seconds']))
+    return regressions
+
+def print_report(results, baseline=None):
+    for size, result in results.items():
+        print(f"\n{size} rows requested, {result['transactions']} transactions read")
+        print(f"{'stage':<34}{'seconds':>10}{'rows/s':>14}{'peak MB':>10}{'vs baseline':>13}")
+        baseline_stages = (baseline or {}).get(size, {}).get('stages', {})
+        for stage, measured in result['stages'].items():
+            previous = baseline_stages.get(stage)
+            change = f"{measured['seconds'] / previous['seconds']:.2f}x" if previous and previous['seconds'] else ''
+            peak = measured.get('peak_mb')
+            print(f"{stage:<34}{measured['seconds']:>10.4f}{measured['rows_per_second'] or 0:>14,.0f}"
+                  f"{'' if peak is None else f'{peak:.1f}':>10}{change:>13}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each stage of the statement pipeline on synthetic data.")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f"Comma-separated row counts, e.g. 1k,1M (default: {DEFAULT_SIZES})")
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'budget-benchmarks'), help="Where generated statements are kept")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass")
+    parser.add_argument('--baseline', help="Results JSON from an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown before a stage counts as a regression")
+    parser.add_argument('--save-baseline', help="Write this run's results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes.split(','):
+        results[str(parse_size(size))] = benchmark_size(args.data_dir, parse_size(size), memory=not args.no_memory)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for size, stage, previous, current in regressions:
+            print(f"REGRESSION {size} rows, {stage}: {previous:.4f}s -> {current:.4f}s")
+        sys.exit(1 if regressions else 0)
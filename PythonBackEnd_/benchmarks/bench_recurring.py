@@ -0,0 +1,86 @@
+# FILE: benchmarks/bench_recurring.py
+# Run from PythonBackEnd_ with: python -m benchmarks.bench_recurring [rows] [merchants]
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+from data_processing import determine_recurring_charges
+
+def determine_recurring_charges_loop(data):
+    # The original per-group implementation, kept as the reference for parity checks
+    if not pd.api.types.is_datetime64_any_dtype(data['date']):
+        data['date'] = pd.to_datetime(data['date'])
+    data['Amount'] = data['Amount'].round(2)
+    grouped = data.groupby('Description')
+
+    recurring_charges = []
+
+    for description, group in grouped:
+        group = group.sort_values(by='date')
+        dates = group['date'].dt.to_period('M')
+        amounts = group['Amount'].values
+
+        if len(dates) >= 3 and all((dates.iloc[i] + 1 == dates.iloc[i + 1]) and abs(amounts[i] - amounts[i + 1]) <= 1 for i in range(len(dates) - 1)):
+            recurring_charges.append((description, group['Amount'].sum(), 'monthly'))
+            continue
+        if len(dates) >= 3 and all((dates.iloc[i] + 3 == dates.iloc[i + 1]) and abs(amounts[i] - amounts[i + 1]) <= 5 for i in range(len(dates) - 1)):
+            recurring_charges.append((description, group['Amount'].sum(), 'quarterly'))
+            continue
+        if len(dates) >= 2 and all((dates.iloc[i] + 6 == dates.iloc[i + 1]) and abs(amounts[i] - amounts[i + 1]) == 0 for i in range(len(dates) - 1)):
+            recurring_charges.append((description, group['Amount'].sum(), 'semi-annual'))
+            continue
+        if len(dates) >= 2 and all((dates.iloc[i] + 12 == dates.iloc[i + 1]) and abs(amounts[i] - amounts[i + 1]) == 0 for i in range(len(dates) - 1)):
+            recurring_charges.append((description, group['Amount'].sum(), 'annual'))
+            continue
+
+    return pd.DataFrame(recurring_charges, columns=['Description', 'Amount', 'Frequency'])
+
+def synthetic_transactions(rows, merchants, seed=0):
+    # Random one-off spending plus merchants charging on monthly, quarterly, semi-annual and annual cadences
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2015-01-01')
+    frames = [pd.DataFrame({
+        'date': start + pd.to_timedelta(rng.integers(0, 3650, rows), unit='D'),
+        'Description': np.char.add('merchant ', rng.integers(0, merchants, rows).astype(str)),
+        'Amount': -np.round(rng.gamma(2.0, 25.0, rows), 2)
+    })]
+    for step, count in ((1, merchants // 10), (3, merchants // 20), (6, merchants // 40), (12, merchants // 40)):
+        for i in range(count):
+            periods = int(rng.integers(2, 120 // step + 1))
+            first = start + pd.DateOffset(months=int(rng.integers(0, 12)), days=int(rng.integers(0, 27)))
+            frames.append(pd.DataFrame({
+                'date': pd.date_range(first, periods=periods, freq=pd.DateOffset(months=step)),
+                'Description': f'subscription {step} {i}',
+                'Amount': -round(float(rng.uniform(5, 100)), 2)
+            }))
+    return pd.concat(frames, ignore_index=True)
+
+def timed(function, data):
+    start = time.perf_counter()
+    result = function(data.copy())
+    return result, time.perf_counter() - start
+
+def run(rows, merchants):
+    data = synthetic_transactions(rows, merchants)
+    print(f"{len(data)} transactions, {data['Description'].nunique()} descriptions")
+
+    vectorized, vectorized_seconds = timed(determine_recurring_charges, data)
+    print(f"vectorized: {vectorized_seconds:.3f}s, {len(vectorized)} recurring charges")
+    loop, loop_seconds = timed(determine_recurring_charges_loop, data)
+    print(f"per-group loop: {loop_seconds:.3f}s, {len(loop)} recurring charges")
+
+    # Parity: same descriptions and frequencies in the same order, totals equal to the cent
+    same = (
+        vectorized['Description'].tolist() == loop['Description'].tolist()
+        and vectorized['Frequency'].tolist() == loop['Frequency'].tolist()
+        and np.allclose(vectorized['Amount'].astype(float), loop['Amount'].astype(float), atol=0.005)
+    )
+    print(f"parity: {'ok' if same else 'MISMATCH'}")
+    print(f"speedup: {loop_seconds / vectorized_seconds:.1f}x")
+    return same
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    merchants = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    sys.exit(0 if run(rows, merchants) else 1)
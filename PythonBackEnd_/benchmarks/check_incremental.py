@@ -0,0 +1,84 @@
+# FILE: benchmarks/check_incremental.py
+# Run from PythonBackEnd_ with: python -m benchmarks.check_incremental [rows]
+# Parity of INCREMENTAL_STATE_DIR mode against a full main() run over the same files: a cold ingest, a warm run
+# with nothing new, appended rows, and a statement whose last line has no trailing newline. Exits 1 on mismatch
+
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import CARD_FILE, CHECKING_FILE, generate_statements
+
+def split_statement(path, share):
+    # Keep the header and the first share of the rows; return the rest for appending later
+    with open(path, 'rb') as f:
+        lines = f.read().splitlines(keepends=True)
+    keep = 1 + int((len(lines) - 1) * share)
+    with open(path, 'wb') as f:
+        f.writelines(lines[:keep])
+    return b''.join(lines[keep:])
+
+def strip_final_newline(path):
+    with open(path, 'rb+') as f:
+        f.seek(-1, 2)
+        if f.read(1) == b'\n':
+            f.seek(-1, 2)
+            f.truncate()
+
+def append(path, content):
+    with open(path, 'ab') as f:
+        f.write(content)
+
+def comparable(data):
+    data = data.reset_index(drop=True)
+    return data.astype({column: object for column in data.columns if isinstance(data[column].dtype, pd.CategoricalDtype)})
+
+def differences(full, incremental):
+    if full[0] is None or incremental[0] is None:
+        return [] if full[0] is None and incremental[0] is None else ['one mode returned no data']
+    problems = []
+    try:
+        pd.testing.assert_frame_equal(comparable(full[0]), comparable(incremental[0]))
+    except AssertionError as e:
+        problems.append(f"data: {str(e).splitlines()[0]} ({len(full[0])} vs {len(incremental[0])} rows)")
+    monthly, other = full[1].sort_index(axis=1), incremental[1].sort_index(axis=1)
+    if not (monthly.shape == other.shape and monthly.index.equals(other.index) and monthly.columns.equals(other.columns)
+            and np.allclose(monthly.to_numpy(dtype=float), other.to_numpy(dtype=float), equal_nan=True)):
+        problems.append(f"monthly spending: {monthly.shape} vs {other.shape}")
+    if full[2] != incremental[2]:
+        problems.append(f"outlier months: {len(full[2])} vs {len(incremental[2])}")
+    if full[3] != incremental[3]:
+        problems.append("summary differs")
+    return problems
+
+def run(rows):
+    import main as app_module
+    ok = True
+    with tempfile.TemporaryDirectory() as directory:
+        generate_statements(directory, rows)
+        paths = [f"{directory}/{CARD_FILE}", f"{directory}/{CHECKING_FILE}"]
+        rest = [split_statement(path, 0.7) for path in paths]
+        strip_final_newline(paths[1])  # Checking exports often end without a newline
+
+        steps = [
+            ('cold ingest', lambda: None),
+            ('warm, nothing new', lambda: None),
+            ('appended rows', lambda: [append(path, (b'\n' if path == paths[1] else b'') + content.rstrip(b'\n')) for path, content in zip(paths, rest)]),
+            ('last lines terminated', lambda: [append(path, b'\n') for path in paths])
+        ]
+        for name, change in steps:
+            change()
+            app_module.incremental_state_dir = None
+            full = app_module.main(paths)
+            app_module.incremental_state_dir = f"{directory}/state"
+            incremental = app_module.main(paths)
+            problems = differences(full, incremental)
+            print(f"{name}: {len(full[0])} rows, {'ok' if not problems else 'MISMATCH'}")
+            for problem in problems:
+                print(f"  {problem}")
+            ok = ok and not problems
+    return ok
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    sys.exit(0 if run(rows) else 1)
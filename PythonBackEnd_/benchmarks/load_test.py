@@ -0,0 +1,57 @@
+# FILE: benchmarks/load_test.py
+# Run from PythonBackEnd_ with: python -m benchmarks.load_test URL [--concurrency N] [--duration SECONDS]
+# Point it at `python main.py` and at `python serve.py` with the same statements to compare the two servers
+
+import argparse
+import threading
+import time
+import urllib.error
+import urllib.request
+import numpy as np
+
+def worker(url, deadline, latencies, errors, lock):
+    # One client looping over requests until the deadline; latencies are collected per request
+    local_latencies, local_errors = [], 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=60) as response:
+                response.read()
+            local_latencies.append(time.perf_counter() - start)
+        except (urllib.error.URLError, OSError):
+            local_errors += 1
+    with lock:
+        latencies.extend(local_latencies)
+        errors.append(local_errors)
+
+def run(url, concurrency, duration, warmup=True):
+    if warmup:
+        urllib.request.urlopen(url, timeout=600).read()  # The first request may still be computing the analysis
+    latencies, errors, lock = [], [], threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [threading.Thread(target=worker, args=(url, deadline, latencies, errors, lock)) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    report = {'url': url, 'concurrency': concurrency, 'requests': len(latencies), 'errors': sum(errors),
+              'seconds': round(elapsed, 3), 'requests_per_second': round(len(latencies) / elapsed, 2)}
+    if latencies:
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+        report.update({'p50_ms': round(p50, 2), 'p90_ms': round(p90, 2), 'p99_ms': round(p99, 2), 'max_ms': round(max(latencies) * 1000, 2)})
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load against one API endpoint: requests/sec and latency percentiles.")
+    parser.add_argument('url', help="e.g. http://127.0.0.1:5000/api/outliers")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--no-warmup', action='store_true')
+    args = parser.parse_args()
+    report = run(args.url, args.concurrency, args.duration, warmup=not args.no_warmup)
+    print(f"{report['url']}: {report['requests']} requests ({report['errors']} errors) in {report['seconds']}s with {report['concurrency']} clients")
+    if report['requests']:
+        print(f"{report['requests_per_second']} req/s  p50 {report['p50_ms']} ms  p90 {report['p90_ms']} ms  p99 {report['p99_ms']} ms  max {report['max_ms']} ms")
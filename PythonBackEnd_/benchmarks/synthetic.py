@@ -0,0 +1,119 @@
+# FILE: benchmarks/synthetic.py
+# Run from PythonBackEnd_ with: python -m benchmarks.synthetic output_dir [rows] [--seed N]
+
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+CARD_FILE = 'card.csv'
+CHECKING_FILE = 'checking.csv'
+WRITE_CHUNK_ROWS = 1000000  # Rows generated and written at a time so 10M-row files fit in memory
+START = pd.Timestamp('2015-01-01')
+DAYS = 3650
+
+CARD_MERCHANTS = ['NETFLIX.COM 866-579', 'SPOTIFY USA #1234', 'LINKEDIN PRE 8345 LINKEDIN.COM', 'SHELL OIL 5744', 'TRADER JOE S #552',
+                  'AMAZON MKTPLACE PMTS*AB12', 'UBER *TRIP HELP.UBER', 'STARBUCKS STORE 0912', 'DD DOORDASH DASHPASS', 'CVS/PHARMACY #0123']
+CARD_CATEGORIES = ['Shopping', 'Food & Drink', 'Gas', 'Groceries', 'Bills & Utilities', 'Entertainment', 'Travel', 'Health & Wellness']
+CHECKING_MERCHANTS = ['RENT PAYMENT 123', 'AGI INS 55 PREM', 'ATM WITHDRAWAL #998', 'BGE ELECTRIC 4411', 'VERIZON WIRELESS 8890']
+
+# (cadence in months, share of the file's rows) for merchants charging a fixed amount on a schedule
+RECURRING_CADENCES = [(1, 0.02), (3, 0.005), (12, 0.002)]
+OUTLIER_SHARE = 0.001  # One-off charges far outside their category's usual range
+
+def card_chunk(rng, rows, merchant_offset):
+    # Transaction Date layout: Transaction Date,Post Date,Description,Category,Type,Amount,Memo
+    dates = START + pd.to_timedelta(rng.integers(0, DAYS, rows), unit='D')
+    descriptions = rng.choice(CARD_MERCHANTS, rows).astype(object)
+    # A long tail of distinct merchants, as real statements have
+    tail = rng.random(rows) < 0.3
+    descriptions[tail] = np.char.add('MERCHANT ', (rng.integers(0, 50000, tail.sum()) + merchant_offset).astype(str))
+    amounts = -np.round(rng.gamma(2.0, 25.0, rows), 2)
+    outliers = rng.random(rows) < OUTLIER_SHARE
+    amounts[outliers] = -np.round(rng.uniform(1000, 5000, outliers.sum()), 2)
+    formatted = dates.strftime('%m/%d/%Y')
+    return pd.DataFrame({
+        'Transaction Date': formatted,
+        'Post Date': formatted,
+        'Description': descriptions,
+        'Category': rng.choice(CARD_CATEGORIES, rows),
+        'Type': 'Sale',
+        'Amount': amounts,
+        'Memo': ''
+    })
+
+def checking_chunk(rng, rows):
+    # Posting Date layout: Details,Posting Date,Description,Amount,Type,Balance,Check or Slip #
+    dates = START + pd.to_timedelta(rng.integers(0, DAYS, rows), unit='D')
+    amounts = np.round(rng.normal(-300, 400, rows), 2)
+    return pd.DataFrame({
+        'Details': np.where(amounts < 0, 'DEBIT', 'CREDIT'),
+        'Posting Date': dates.strftime('%m/%d/%Y'),
+        'Description': rng.choice(CHECKING_MERCHANTS, rows),
+        'Amount': amounts,
+        'Type': 'ACH_DEBIT',
+        'Balance': 1000.0,
+        'Check or Slip #': ''
+    })
+
+def recurring_rows(rng, rows):
+    # Subscriptions on monthly, quarterly and annual schedules with a fixed amount per merchant
+    frames = []
+    for cadence, share in RECURRING_CADENCES:
+        periods = max(2, 120 // cadence)
+        merchants = max(1, int(rows * share) // periods)
+        for i in range(merchants):
+            first = START + pd.DateOffset(months=int(rng.integers(0, 12)), days=int(rng.integers(0, 27)))
+            dates = pd.date_range(first, periods=periods, freq=pd.DateOffset(months=cadence)).strftime('%m/%d/%Y')
+            frames.append(pd.DataFrame({
+                'Transaction Date': dates,
+                'Post Date': dates,
+                'Description': f'SUBSCRIPTION {cadence}M {i}',
+                'Category': 'Entertainment',
+                'Type': 'Sale',
+                'Amount': -round(float(rng.uniform(5, 100)), 2),
+                'Memo': ''
+            }))
+    return pd.concat(frames, ignore_index=True)
+
+def write_chunks(path, chunks):
+    header = True
+    with open(path, 'w', newline='') as f:
+        for chunk in chunks:
+            chunk.to_csv(f, index=False, header=header)
+            header = False
+
+def generate_statements(output_dir, rows, seed=0):
+    # Writes a credit card file and a checking file with `rows` transactions between them (3:1) and returns their paths
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    card_rows = rows - rows // 4
+    checking_rows = rows // 4
+
+    recurring = recurring_rows(rng, card_rows)
+    card_rows = max(0, card_rows - len(recurring))
+
+    def card_chunks():
+        yield recurring
+        for offset in range(0, card_rows, WRITE_CHUNK_ROWS):
+            yield card_chunk(rng, min(WRITE_CHUNK_ROWS, card_rows - offset), offset)
+
+    def checking_chunks():
+        yield checking_chunk(rng, 0)
+        for offset in range(0, checking_rows, WRITE_CHUNK_ROWS):
+            yield checking_chunk(rng, min(WRITE_CHUNK_ROWS, checking_rows - offset))
+
+    card_path = os.path.join(output_dir, CARD_FILE)
+    checking_path = os.path.join(output_dir, CHECKING_FILE)
+    write_chunks(card_path, card_chunks())
+    write_chunks(checking_path, checking_chunks())
+    return [card_path, checking_path]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic credit card and checking statements.")
+    parser.add_argument('output_dir')
+    parser.add_argument('rows', nargs='?', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for path in generate_statements(args.output_dir, args.rows, args.seed):
+        print(f"Wrote {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
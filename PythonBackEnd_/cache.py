@@ -0,0 +1,87 @@
+# FILE: cache.py
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from mappings import CATEGORY_MAPPING, DESCRIPTION_MAPPING, COLOR_PALETTE
+
+# Number of distinct input fingerprints to keep results for
+MAX_CACHED_RESULTS = 4
+
+_results = OrderedDict()
+_content_hashes = {}
+_stats = {'hits': 0, 'misses': 0}
+_lock = threading.Lock()
+_compute_lock = threading.Lock()
+
+def content_hash(file_path, mtime_ns, size):
+    # Hashing is only repeated when the file's mtime or size changes
+    # The file is read outside the lock; only the bookkeeping shared by request threads runs under it
+    key = (file_path, mtime_ns, size)
+    with _lock:
+        cached = _content_hashes.get(key)
+    if cached is not None:
+        return cached
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    cached = digest.hexdigest()
+    with _lock:
+        for stale_key in [k for k in _content_hashes if k[0] == file_path]:
+            del _content_hashes[stale_key]
+        _content_hashes[key] = cached
+    return cached
+
+def file_fingerprint(file_path):
+    if not file_path or not os.path.exists(file_path):
+        return (file_path, None, None, None)
+    stat = os.stat(file_path)
+    return (file_path, stat.st_mtime_ns, stat.st_size, content_hash(file_path, stat.st_mtime_ns, stat.st_size))
+
+def mappings_fingerprint():
+    digest = hashlib.sha256()
+    for mapping in (CATEGORY_MAPPING, DESCRIPTION_MAPPING, COLOR_PALETTE):
+        digest.update(repr(sorted(mapping.items())).encode('utf-8'))
+    return digest.hexdigest()
+
+def input_fingerprint(file_paths):
+    return (tuple(file_fingerprint(file_path) for file_path in file_paths), mappings_fingerprint())
+
+def get_or_compute(file_paths, compute):
+    # Serve the result for these exact inputs from memory, recomputing only when a file or mapping changed
+    key = input_fingerprint(file_paths)
+    with _lock:
+        if key in _results:
+            _stats['hits'] += 1
+            _results.move_to_end(key)
+            return _results[key]
+
+    # Only one thread runs the pipeline; concurrent misses wait and then read its result
+    with _compute_lock:
+        with _lock:
+            if key in _results:
+                _stats['hits'] += 1
+                _results.move_to_end(key)
+                return _results[key]
+            _stats['misses'] += 1
+        result = compute()
+        with _lock:
+            _results[key] = result
+            while len(_results) > MAX_CACHED_RESULTS:
+                _results.popitem(last=False)
+    return result
+
+def cache_stats():
+    with _lock:
+        return {
+            'hits': _stats['hits'],
+            'misses': _stats['misses'],
+            'entries': len(_results)
+        }
+
+def clear_cache():
+    with _lock:
+        _results.clear()
+        _content_hashes.clear()
@@ -0,0 +1,155 @@
+# FILE: categorization.py
+
+import re
+import pandas as pd
+from mappings import CATEGORY_MAPPING, DESCRIPTION_MAPPING
+from aggregates import CUBE_LEVELS, MEASURES
+
+UNCATEGORIZED = 'uncategorized'
+TOKEN_PATTERN = re.compile(r'[a-z0-9&]+')
+# A merchant token votes for a category only when it is seen this often and almost always with that category
+MIN_TOKEN_SUPPORT = 3
+TOKEN_CONFIDENCE = 0.8
+MIN_TOKEN_LENGTH = 3
+
+_keyword_indexes = {}
+
+def tokens(description):
+    return TOKEN_PATTERN.findall(description.lower())
+
+def resolve_category(value):
+    # A mapping value counts as a category when it is a CATEGORY_MAPPING key or one of its targets
+    if value in CATEGORY_MAPPING:
+        return CATEGORY_MAPPING[value]
+    if value in set(CATEGORY_MAPPING.values()):
+        return value
+    return None
+
+class KeywordIndex:
+    # Token trie of category keywords: CATEGORY_MAPPING keys ('rent', 'dining out', ...) and DESCRIPTION_MAPPING
+    # merchants whose standardized name is a category ('uber' -> transportation). Matches whole tokens anywhere
+    # in a description, preferring the longest keyword. Results are memoized per description
+    VALUE = object()
+
+    def __init__(self, category_mapping, description_mapping):
+        self.root = {}
+        self.matches = {}
+        keywords = {key: target for key, target in category_mapping.items()}
+        for merchant, standardized in description_mapping.items():
+            category = resolve_category(standardized)
+            if category is not None:
+                keywords[merchant] = category
+        for keyword, category in keywords.items():
+            node = self.root
+            for token in tokens(keyword):
+                node = node.setdefault(token, {})
+            node[self.VALUE] = category
+
+    def match(self, description_tokens, description):
+        if description in self.matches:
+            return self.matches[description]
+        best, best_length = None, 0
+        for start in range(len(description_tokens)):
+            node = self.root
+            for length, token in enumerate(description_tokens[start:], 1):
+                node = node.get(token)
+                if node is None:
+                    break
+                if self.VALUE in node and length > best_length:
+                    best, best_length = node[self.VALUE], length
+        self.matches[description] = best
+        return best
+
+def get_keyword_index(category_mapping=CATEGORY_MAPPING, description_mapping=DESCRIPTION_MAPPING):
+    key = (tuple(sorted(category_mapping.items())), tuple(sorted(description_mapping.items())))
+    index = _keyword_indexes.get(key)
+    if index is None:
+        index = _keyword_indexes[key] = KeywordIndex(category_mapping, description_mapping)
+    return index
+
+class MerchantIndex:
+    # What the already-categorized (credit card) rows say: each merchant's most common category, and merchant
+    # tokens that almost always come with one category ('starbucks' -> restaurants)
+
+    def __init__(self, data):
+        known = data['Category'].notna() & (data['Category'] != UNCATEGORIZED)
+        pairs = data.loc[known].groupby(['Description', 'Category'], observed=True).size()
+        pairs = pairs[pairs > 0].reset_index(name='count')
+        pairs = pairs.astype({'Description': object, 'Category': object})
+
+        ranked = pairs.sort_values(['Description', 'count', 'Category'], ascending=[True, False, True]).drop_duplicates('Description')
+        self.merchants = dict(zip(ranked['Description'], ranked['Category']))
+
+        votes = pairs.assign(Token=pairs['Description'].map(lambda description: sorted(set(tokens(description)))))
+        votes = votes.explode('Token').dropna(subset=['Token'])
+        votes = votes[votes['Token'].str.len() >= MIN_TOKEN_LENGTH]
+        by_category = votes.groupby(['Token', 'Category'])['count'].sum()
+        totals = by_category.groupby(level='Token').sum()
+        best = by_category.sort_values(ascending=False).reset_index().drop_duplicates('Token').set_index('Token')
+        share = best['count'] / totals.reindex(best.index)
+        confident = (totals.reindex(best.index) >= MIN_TOKEN_SUPPORT) & (share >= TOKEN_CONFIDENCE)
+        self.token_categories = best.loc[confident, 'Category'].to_dict()
+        self.token_support = totals.to_dict()
+
+    def match_tokens(self, description_tokens):
+        # The category of the best-supported confident token, if any
+        best, support = None, 0
+        for token in description_tokens:
+            category = self.token_categories.get(token)
+            if category is not None and self.token_support[token] > support:
+                best, support = category, self.token_support[token]
+        return best
+
+def infer_category(description, merchant_index, keyword_index):
+    # Exact merchant seen with a category, then mapping keywords, then merchant token votes
+    if description in merchant_index.merchants:
+        return merchant_index.merchants[description]
+    description_tokens = tokens(description)
+    return keyword_index.match(description_tokens, description) or merchant_index.match_tokens(description_tokens)
+
+def missing_categories(categories):
+    return categories.isna() | (categories == UNCATEGORIZED)
+
+def infer_categories(data):
+    # Category inferred for each merchant that has rows with a missing or 'uncategorized' category. Each distinct
+    # merchant is looked up once, so the cost grows with the number of merchants rather than rows. Merchants
+    # nothing matches are left out
+    missing = missing_categories(data['Category'])
+    if not missing.any():
+        return {}
+    merchant_index = MerchantIndex(data)
+    keyword_index = get_keyword_index()
+    inferred = {}
+    for description in pd.unique(data.loc[missing, 'Description'].dropna().astype(object)):
+        category = infer_category(description, merchant_index, keyword_index)
+        if category is not None:
+            inferred[description] = category
+    return inferred
+
+def categorize_transactions(data, inferred=None):
+    # Fill missing and 'uncategorized' categories from infer_categories, leaving rows nothing matches as they were.
+    # Returns data itself when nothing changes, otherwise a new frame
+    if inferred is None:
+        inferred = infer_categories(data)
+    if not inferred:
+        return data
+    missing = missing_categories(data['Category'])
+    filled = data.loc[missing, 'Description'].astype(object).map(inferred)
+    categories = data['Category'].astype(object)
+    categories[missing] = filled.where(filled.notna(), categories[missing])
+    return data.assign(Category=categories.astype('category'))
+
+def categorize_cells(cells, inferred):
+    # The same fill applied to aggregate cube cells (Month x Category x Description), so incrementally maintained
+    # cells stay valid instead of being rebuilt from every row. Cells that now share a category are merged
+    if cells is None or cells.empty or not inferred:
+        return cells
+    keys = cells.index.to_frame(index=False)
+    keys = keys.astype({'Category': object, 'Description': object})
+    filled = keys['Description'].map(inferred)
+    replace = missing_categories(keys['Category']) & filled.notna()
+    if not replace.any():
+        return cells
+    keys.loc[replace, 'Category'] = filled[replace]
+    remapped = cells.set_axis(pd.MultiIndex.from_frame(keys), axis=0)
+    return remapped.groupby(level=CUBE_LEVELS, observed=True, dropna=False).agg(MEASURES)
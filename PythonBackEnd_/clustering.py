@@ -0,0 +1,110 @@
+# FILE: clustering.py
+
+import re
+import numpy as np
+import pandas as pd
+
+# Descriptions are compared as sets of character 3-grams ('spotify usa' ~ 'spotify us')
+SHINGLE_SIZE = 3
+SIMILARITY_THRESHOLD = 0.5
+# MinHash signatures of BANDS x ROWS_PER_BAND hashes. Two descriptions share at least one band bucket with
+# probability 1 - (1 - s^ROWS_PER_BAND)^BANDS for Jaccard similarity s: ~0.88 at s=0.5, ~0.36 at s=0.3
+BANDS = 16
+ROWS_PER_BAND = 3
+HASH_PRIME = (1 << 31) - 1
+BAND_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+SEED = 0
+SEPARATORS = re.compile(r'[^a-z0-9&]+')
+
+def normalize(description):
+    return SEPARATORS.sub(' ', description.lower()).strip()
+
+def shingles(description):
+    if len(description) <= SHINGLE_SIZE:
+        return {description}
+    return {description[i:i + SHINGLE_SIZE] for i in range(len(description) - SHINGLE_SIZE + 1)}
+
+def minhash_signatures(shingle_sets):
+    # One row of BANDS * ROWS_PER_BAND min-hashes per shingle set, computed a hash function at a time over all
+    # sets' shingles at once
+    vocabulary = {}
+    ids = np.fromiter((vocabulary.setdefault(shingle, len(vocabulary)) for shingle_set in shingle_sets for shingle in shingle_set), dtype=np.int64)
+    # Renumber shingles in sorted order: set iteration order depends on the per-process string hash seed, and
+    # every worker process must produce the same clusters
+    ranks = np.empty(len(vocabulary), dtype=np.uint64)
+    ranks[np.argsort(np.array(list(vocabulary), dtype=object))] = np.arange(len(vocabulary), dtype=np.uint64)
+    ids = ranks[ids]
+    lengths = np.fromiter((len(shingle_set) for shingle_set in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+    starts = np.r_[0, np.cumsum(lengths)[:-1]]
+    rng = np.random.default_rng(SEED)
+    hashes = BANDS * ROWS_PER_BAND
+    a = rng.integers(1, HASH_PRIME, size=hashes).astype(np.uint64)
+    b = rng.integers(0, HASH_PRIME, size=hashes).astype(np.uint64)
+    signatures = np.empty((len(shingle_sets), hashes), dtype=np.uint64)
+    for k in range(hashes):
+        signatures[:, k] = np.minimum.reduceat((a[k] * ids + b[k]) % HASH_PRIME, starts)
+    return signatures
+
+def candidate_pairs(signatures):
+    # Descriptions sharing a band bucket. Within a bucket each member is paired with the previous member and the
+    # first one rather than with every other member, so a bucket of m descriptions yields under 2m pairs
+    first, second = [], []
+    for band in range(BANDS):
+        block = signatures[:, band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        keys = block[:, 0].copy()
+        for column in range(1, ROWS_PER_BAND):
+            keys = keys * BAND_MULTIPLIER + block[:, column]
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        same = np.r_[False, sorted_keys[1:] == sorted_keys[:-1]]
+        positions = np.arange(len(order))
+        bucket_start = np.maximum.accumulate(np.where(same, 0, positions))
+        members = np.flatnonzero(same)
+        first.extend([order[members - 1], order[bucket_start[members]]])
+        second.extend([order[members], order[members]])
+    if not first:
+        return np.empty((0, 2), dtype=np.int64)
+    first, second = np.concatenate(first), np.concatenate(second)
+    # Each unordered pair once, deduplicated as a single int64 key
+    low, high = np.minimum(first, second), np.maximum(first, second)
+    keys = np.unique(low[low != high].astype(np.int64) * len(signatures) + high[low != high])
+    return np.column_stack([keys // len(signatures), keys % len(signatures)])
+
+def find_root(parents, item):
+    root = item
+    while parents[root] != root:
+        root = parents[root]
+    while parents[item] != root:
+        parents[item], item = root, parents[item]
+    return root
+
+def cluster_descriptions(descriptions, threshold=SIMILARITY_THRESHOLD):
+    # Cluster label per description: candidate pairs from the MinHash buckets are kept when their exact
+    # Jaccard similarity reaches the threshold, and joined transitively with union-find
+    normalized = [normalize(description) for description in descriptions]
+    shingle_sets = [shingles(description) for description in normalized]
+    parents = list(range(len(descriptions)))
+    if len(descriptions) < 2:
+        return np.asarray(parents)
+    for i, j in candidate_pairs(minhash_signatures(shingle_sets)).tolist():
+        left, right = shingle_sets[i], shingle_sets[j]
+        if len(left & right) >= threshold * len(left | right):
+            root_i, root_j = find_root(parents, i), find_root(parents, j)
+            if root_i != root_j:
+                parents[max(root_i, root_j)] = min(root_i, root_j)
+    return np.asarray([find_root(parents, i) for i in range(len(descriptions))])
+
+def cluster_merchants(descriptions, threshold=SIMILARITY_THRESHOLD):
+    # Near-duplicate merchant descriptions, as a Series from each clustered description to its cluster's most
+    # frequent description. Descriptions with no near duplicate are left out
+    counts = descriptions.astype(object).value_counts()
+    if counts.empty:
+        return pd.Series(dtype=object, name='Merchant')
+    # Most frequent first, so each cluster's representative is its first member
+    ranked = pd.DataFrame({'description': counts.index, 'count': counts.to_numpy()}).sort_values(['count', 'description'], ascending=[False, True])
+    uniques = ranked['description'].tolist()
+    labels = cluster_descriptions(uniques, threshold)
+    sizes = np.bincount(labels, minlength=len(uniques))
+    clustered = np.flatnonzero(sizes[labels] > 1)
+    representatives = np.asarray(uniques, dtype=object)[labels[clustered]]
+    return pd.Series(representatives, index=pd.Index(np.asarray(uniques, dtype=object)[clustered], name='Description'), name='Merchant')
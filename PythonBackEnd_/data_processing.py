@@ -1,7 +1,11 @@
+import numpy as np
 import pandas as pd
-import re
 from utils import standardize_descriptions
+from normalization import DESCRIPTION_NOISE, clean_descriptions
 from mappings import CATEGORY_MAPPING, DESCRIPTION_MAPPING
+from money import amount_cents, to_cents, to_dollars
+
+CATEGORICAL_COLUMNS = ['Description', 'Category', 'Month']
 
 def clean_data(data):
     # Check if 'date' column exists, otherwise use 'Transaction Date'
@@ -19,7 +23,7 @@ def clean_data(data):
         raise KeyError("The input file must contain a 'description' or 'Description' column.")
     
     # Clean the Description field
-    data['Description'] = data['Description'].apply(clean_description)
+    data['Description'] = clean_descriptions(data['Description'])
     # Convert Description and Category fields to lowercase
     data['Description'] = data['Description'].str.lower()
     if 'Category' in data.columns:
@@ -34,17 +38,33 @@ def clean_data(data):
     # Filter out positive amounts (assuming negative amounts are expenses)
     data = data[data['Amount'] < 0]
 
-    # Replace NaN values with None
-    data = data.where(pd.notnull(data), None).astype(object)
-    
-    return data
+    # Keep native dtypes; NaN is only converted to None when serializing to JSON
+    return compact_dtypes(data)
+
+def compact_dtypes(data):
+    # Low-cardinality text columns as categoricals, dates as datetime64 and amounts as exact int64 cents.
+    # Cents are parsed once here; Amount is re-derived from them so the dollar view is exact to the cent
+    dtypes = {column: 'category' for column in CATEGORICAL_COLUMNS if column in data.columns}
+    if 'Cents' in data.columns:
+        dtypes['Cents'] = 'int64'
+    data = data.astype(dtypes)
+    cents = data['Cents'] if 'Cents' in data.columns else to_cents(data['Amount'].astype(float))
+    return data.assign(Amount=to_dollars(cents), Cents=cents)
 
 def clean_description(description):
     # Use regular expression to remove any invoice IDs or extraneous information
-    cleaned_description = re.sub(r'\s*[\*#]\S+|\d+', '', description)  # Remove any * or # followed by non-whitespace characters and digits
+    cleaned_description = DESCRIPTION_NOISE.sub('', description)  # Remove any * or # followed by non-whitespace characters and digits
     return cleaned_description.strip()
 
-def determine_recurring_charges(data):
+# Recurrence rules checked in order: (frequency, months between charges, minimum charges, amount tolerance in cents)
+RECURRENCE_RULES = [
+    ('monthly', 1, 3, 100),
+    ('quarterly', 3, 3, 500),
+    ('semi-annual', 6, 2, 0),
+    ('annual', 12, 2, 0)
+]
+
+def determine_recurring_charges(data, clusters=None):
     # Ensure 'date' column is in datetime format
     if not pd.api.types.is_datetime64_any_dtype(data['date']):
         data['date'] = pd.to_datetime(data['date'])
@@ -52,43 +72,60 @@ def determine_recurring_charges(data):
     # Ensure 'Description' column exists
     if 'Description' not in data.columns:
         raise KeyError("The data must contain a 'Description' column.")
-    
-    # Group by Description to identify potential recurring charges
-    data['Amount'] = data['Amount'].round(2)  # Round amounts to 2 decimal places for consistency
-    grouped = data.groupby('Description')
-
-    recurring_charges = []
-
-    for description, group in grouped:
-        group = group.sort_values(by='date')
-        dates = group['date'].dt.to_period('M')
-        amounts = group['Amount'].values
-
-        # Check for monthly recurrence
-        if len(dates) >= 3 and all((dates.iloc[i] + 1 == dates.iloc[i + 1]) and abs(amounts[i] - amounts[i + 1]) <= 1 for i in range(len(dates) - 1)):
-            total_amount = group['Amount'].sum()
-            recurring_charges.append((description, total_amount, 'monthly'))
-            continue
-
-        # Check for quarterly recurrence (every 3 months)
-        if len(dates) >= 3 and all((dates.iloc[i] + 3 == dates.iloc[i + 1]) and abs(amounts[i] - amounts[i + 1]) <= 5 for i in range(len(dates) - 1)):
-            total_amount = group['Amount'].sum()
-            recurring_charges.append((description, total_amount, 'quarterly'))
-            continue
-
-        # Check for semi-annual recurrence (every 6 months)
-        if len(dates) >= 2 and all((dates.iloc[i] + 6 == dates.iloc[i + 1]) and abs(amounts[i] - amounts[i + 1]) == 0 for i in range(len(dates) - 1)):
-            total_amount = group['Amount'].sum()
-            recurring_charges.append((description, total_amount, 'semi-annual'))
-            continue
-
-        # Check for annual recurrence (every year)
-        if len(dates) >= 2 and all((dates.iloc[i] + 12 == dates.iloc[i + 1]) and abs(amounts[i] - amounts[i + 1]) == 0 for i in range(len(dates) - 1)):
-            total_amount = group['Amount'].sum()
-            recurring_charges.append((description, total_amount, 'annual'))
-            continue
-
-    return pd.DataFrame(recurring_charges, columns=['Description', 'Amount', 'Frequency'])
+
+    # Integer cents, so amount changes are compared exactly against the tolerances
+    cents = amount_cents(data)
+    recurring_charges = match_recurrence(data['Description'], data['date'], cents)
+    if clusters is None or clusters.empty:
+        return recurring_charges
+
+    # Charges of near-duplicate descriptions (clustering.cluster_merchants) again, as one merchant per cluster
+    clustered = data['Description'].isin(clusters.index).to_numpy()
+    merchants = data['Description'][clustered].astype(object).map(clusters)
+    cluster_charges = match_recurrence(merchants, data['date'][clustered], cents[clustered])
+    return merge_cluster_charges(recurring_charges, cluster_charges, clusters)
+
+def match_recurrence(descriptions, dates, cents):
+    # Sort once by Description then date, and compare each charge with the previous one of the same Description
+    codes, descriptions = pd.factorize(descriptions, sort=True)
+    month_index = (dates.dt.year * 12 + dates.dt.month).to_numpy(dtype=float)
+    amounts = cents.to_numpy(dtype=np.int64)
+    valid = codes >= 0
+    codes, month_index, amounts = codes[valid], month_index[valid], amounts[valid]
+    order = np.lexsort((dates.to_numpy()[valid], codes))
+    codes, month_index, amounts = codes[order], month_index[order], amounts[order]
+
+    group_count = len(descriptions)
+    group_sizes = np.bincount(codes, minlength=group_count)
+    continues_group = np.r_[False, codes[1:] == codes[:-1]]
+    month_diffs = np.r_[np.nan, np.diff(month_index)]
+    amount_diffs = np.r_[0, np.abs(np.diff(amounts))]
+
+    matched_rule = np.full(group_count, -1)
+    for rule, (frequency, months, min_count, tolerance) in enumerate(RECURRENCE_RULES):
+        # A group matches when none of its consecutive pairs breaks the rule
+        breaks = continues_group & ~((month_diffs == months) & (amount_diffs <= tolerance))
+        matches = (group_sizes >= min_count) & (np.bincount(codes[breaks], minlength=group_count) == 0)
+        matched_rule[matches & (matched_rule < 0)] = rule
+
+    recurring = np.flatnonzero(matched_rule >= 0)
+    frequencies = np.array([frequency for frequency, _, _, _ in RECURRENCE_RULES], dtype=object)
+    totals = to_dollars(pd.Series(amounts).groupby(codes).sum().reindex(recurring).to_numpy())
+    return pd.DataFrame({
+        'Description': np.asarray(descriptions, dtype=object)[recurring],
+        'Amount': totals,
+        'Frequency': frequencies[matched_rule[recurring]]
+    }, columns=['Description', 'Amount', 'Frequency'])
+
+def merge_cluster_charges(recurring_charges, cluster_charges, clusters):
+    # A cluster forming a recurring chain replaces the results of its member descriptions. Clusters that do not
+    # leave them as they were, so a wrong merge can only fail to match, never hide an exact recurring charge
+    if cluster_charges.empty:
+        return recurring_charges
+    members = clusters.index[clusters.isin(cluster_charges['Description'])]
+    kept = recurring_charges[~recurring_charges['Description'].isin(members)]
+    merged = pd.concat([kept, cluster_charges], ignore_index=True)
+    return merged.sort_values('Description', kind='stable', ignore_index=True)
 
 def identify_unique_spend_patterns(data):
     # Implement your logic to identify unique spend patterns here
@@ -98,10 +135,12 @@ def analyze_recurring_charges(recurring_charges, data):
     recurring_charges = standardize_descriptions(recurring_charges, DESCRIPTION_MAPPING)
     
     # Group by frequency and calculate total amount and count for each type
-    analysis = recurring_charges.groupby('Frequency').agg(
-        Total_Amount=('Amount', 'sum'),
-        Count=('Amount', 'size')
+    # Totals are summed in cents and converted to dollars afterwards
+    analysis = recurring_charges.assign(Cents=to_cents(recurring_charges['Amount'])).groupby('Frequency').agg(
+        Total_Amount=('Cents', 'sum'),
+        Count=('Cents', 'size')
     ).reset_index()
+    analysis['Total_Amount'] = to_dollars(analysis['Total_Amount'])
     
     # Extract summaries for each frequency type
     monthly_summary = analysis[analysis['Frequency'] == 'monthly']
@@ -0,0 +1,98 @@
+# FILE: figures.py
+
+import hashlib
+import os
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.offline import get_plotlyjs
+from plotly.subplots import make_subplots
+from mappings import COLOR_PALETTE
+from aggregates import get_cube
+
+PLOTLY_JS_FILE = 'plotly.min.js'
+
+_figure = None
+
+class FigureEntry:
+    # One built figure with its serialized forms, created lazily and reused until the data changes
+
+    def __init__(self, data, fig):
+        self.data = data
+        self.fig = fig
+        self._json = None
+        self._etag = None
+        self._html = {}
+
+    def json(self):
+        if self._json is None:
+            self._json = pio.to_json(self.fig, validate=False)
+            self._etag = hashlib.sha1(self._json.encode('utf-8')).hexdigest()
+        return self._json
+
+    def etag(self):
+        self.json()
+        return self._etag
+
+    def html(self, plotly_js):
+        # plotly.js is referenced by URL or path rather than inlined into every render
+        if plotly_js not in self._html:
+            self._html[plotly_js] = pio.to_html(self.fig, full_html=False, include_plotlyjs=plotly_js, validate=False)
+        return self._html[plotly_js]
+
+def plot_transactions(transactions, title, color, row, xaxis_title):
+    if not transactions.empty:
+        bar_trace = go.Bar(x=transactions['Description'], y=transactions['Amount'], name=title, marker_color=color)
+        return bar_trace, row, xaxis_title
+    else:
+        return None, row, xaxis_title
+
+def build_figure(data, monthly_spending_data, outlier_months, store=None):
+    # Monthly spending lines plus one bar chart of top transactions per outlier month
+    total_plots = len(outlier_months) + 1
+    vertical_spacing = min(0.024, 1 / (total_plots - 1)) if total_plots > 1 else 0.024
+    fig = make_subplots(rows=total_plots, cols=1, shared_xaxes=False, vertical_spacing=vertical_spacing)
+
+    # Line chart for monthly spending comparison
+    for category in monthly_spending_data.columns:
+        fig.add_trace(go.Scatter(x=monthly_spending_data.index, y=monthly_spending_data[category], mode='lines+markers', name=category, line=dict(color=COLOR_PALETTE.get(category, 'grey'))), row=1, col=1)
+
+    fig.update_layout(title='Monthly Spending Comparison', xaxis_title='Month', yaxis_title='Amount', legend_title='Category')
+
+    # Bar charts for outlier months with more space for readability
+    # Top transactions come from the SQLite store when one is configured, otherwise from the aggregate cube
+    source = store if store is not None else get_cube(data)
+    current_row = 2
+    for month, category in outlier_months:
+        # Extract the most negative transactions for the outlier month and category
+        top_transactions = source.top_transactions(month, category)
+        color = COLOR_PALETTE.get(category, 'grey')  # Use default color if category not found
+        xaxis_title = f"{month} - {category}"
+        bar_trace, row, xaxis_title = plot_transactions(top_transactions, f'Top Transactions for {category} in {month}', color, current_row, xaxis_title)
+        if bar_trace:
+            fig.add_trace(bar_trace, row=row, col=1)
+            fig.update_xaxes(title_text=xaxis_title, row=row, col=1)
+            fig.update_yaxes(title_text='Amount', row=row, col=1)
+            current_row += 1
+
+    # Adjusting layout for better readability
+    fig.update_layout(height=300 * total_plots, showlegend=True, title_text="Monthly Spending and Outlier Transactions")
+    return fig
+
+def get_figure(data, monthly_spending_data, outlier_months, store=None):
+    # The figure for this cleaned dataset, rebuilt only when the dataset changes
+    global _figure
+    if _figure is None or _figure.data is not data:
+        _figure = FigureEntry(data, build_figure(data, monthly_spending_data, outlier_months, store))
+    return _figure
+
+def plotly_js_source(directory=None):
+    # 'cdn' by default; with a directory, plotly.js is written there once and referenced by path
+    if not directory:
+        return 'cdn'
+    path = os.path.join(directory, PLOTLY_JS_FILE)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+        os.replace(path + '.tmp', path)
+    return path
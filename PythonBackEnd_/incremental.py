@@ -0,0 +1,246 @@
+# FILE: incremental.py
+
+import hashlib
+import io
+import json
+import logging
+import os
+import pandas as pd
+from contextlib import contextmanager
+from utils import input_set_key, prepare_statement, read_csv
+from bank_formats import read_header, sniff_format
+from data_processing import clean_data, compact_dtypes
+from aggregates import cube_cells, merge_cells
+
+STATE_FILE = 'state.json'
+# Bumped when the stored cleaned rows or cube cells change shape; older state is re-ingested from scratch.
+# 2: cube cells hold integer cents
+STATE_VERSION = 2
+# Bytes hashed at the start and just before the watermark to detect rewritten (not appended) exports
+CHECK_WINDOW = 4096
+
+LOCK_FILE = 'state.lock'
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; concurrent runs over one input set are then not serialized
+    fcntl = None
+
+def ingest_incremental(file_paths, state_dir):
+    # Parse, clean and aggregate only the rows appended to each file since the last run.
+    # Returns the cleaned transactions and their aggregate cube cells. Each set of input files (each batch.py
+    # account) keeps its own watermarks in a subdirectory, and runs over the same set take turns
+    state_dir = os.path.join(state_dir, input_set_key(file_paths))
+    os.makedirs(state_dir, exist_ok=True)
+    with state_lock(state_dir):
+        state = load_state(state_dir)
+        files_state = state.setdefault('files', {})
+
+        cleaned_frames = []
+        for file_path in file_paths:
+            logger.debug("Processing file: %s", file_path)
+            if not file_path or not os.path.exists(file_path):
+                logger.error("File not found - %s", file_path)
+                continue
+            try:
+                watermark, cleaned, cells, partial = load_file(file_path, files_state.get(file_path), state_dir)
+            except Exception as e:
+                logger.error("Error reading %s: %s", file_path, e)
+                continue
+            if watermark is None:
+                continue
+            files_state[file_path] = watermark
+            cleaned_frames.append((watermark, cleaned, cells, partial))
+
+        save_state(state_dir, state)
+        remove_unreferenced(state_dir, state)
+        return combine_files(cleaned_frames)
+
+def load_file(file_path, watermark, state_dir):
+    # Stored state that cannot be read back (a write cut short, files removed by hand) is discarded and the
+    # file ingested again from scratch
+    if watermark is not None:
+        try:
+            return read_file(file_path, dict(watermark), state_dir)
+        except Exception as e:
+            logger.warning("Discarding incremental state for %s: %s", file_path, e)
+    return read_file(file_path, None, state_dir)
+
+def read_file(file_path, watermark, state_dir):
+    watermark, partial = refresh_file(file_path, watermark, state_dir)
+    if watermark is None:
+        return None, None, None, None
+    cleaned = pd.read_pickle(os.path.join(state_dir, watermark['cleaned']))
+    if len(cleaned) != watermark['rows']:
+        raise ValueError(f"{watermark['cleaned']} holds {len(cleaned)} rows, the watermark {watermark['rows']}")
+    return watermark, cleaned, pd.read_pickle(os.path.join(state_dir, watermark['cube'])), partial
+
+def refresh_file(file_path, watermark, state_dir):
+    # Returns the updated watermark and the cleaned rows of an unterminated last line, if any
+    size = os.path.getsize(file_path)
+    if watermark is not None and 'cube' in watermark and is_append_of(file_path, size, watermark):
+        if size == watermark['offset']:
+            return watermark, None
+        with open(file_path, 'rb') as f:
+            f.seek(watermark['offset'])
+            tail = f.read()
+        return append_rows(file_path, watermark['header'].encode('utf-8'), tail, watermark, state_dir, size=size)
+
+    with open(file_path, 'rb') as f:
+        content = f.read()
+
+    logger.info("Full ingest of %s", file_path)
+    header_end = content.find(b'\n') + 1
+    if header_end == 0:
+        return None, None
+    watermark = {
+        'header': content[:header_end].decode('utf-8'),
+        'offset': header_end,
+        'rows': 0,
+        'last_date': None,
+        'has_category': 'Category' in read_header(content[:header_end])
+    }
+    return append_rows(file_path, content[:header_end], content[header_end:], watermark, state_dir, reset=True, size=size)
+
+def append_rows(file_path, header, tail, watermark, state_dir, reset=False, size=None):
+    # Complete lines are consumed and persisted. Many exports end without a newline, so an unterminated last line
+    # is parsed too, unless the file is still being written, but not consumed: the watermark stops before it
+    # and keeps its length, and every run re-reads it until a newline completes it
+    end = tail.rfind(b'\n') + 1
+    complete, remainder = tail[:end], tail[end:]
+
+    new_rows = parse_rows(file_path, header, complete, watermark)
+    if new_rows is None:
+        return None, None
+    logger.info("New rows from %s: %d", file_path, len(new_rows))
+    if reset or not new_rows.empty:
+        if reset:
+            cleaned, cells = pd.DataFrame(), None
+        else:
+            cleaned = pd.read_pickle(os.path.join(state_dir, watermark['cleaned']))
+            cells = pd.read_pickle(os.path.join(state_dir, watermark['cube']))
+        if not new_rows.empty:
+            cleaned = pd.concat([cleaned, new_rows], ignore_index=True)
+            cells = merge_cells(cells, cube_cells(new_rows))
+        # Each write goes to new file names that only state.json's replacement makes current, so an interrupted
+        # run leaves the previous rows and watermark in place
+        name = f"{file_key(file_path)}.{os.urandom(4).hex()}"
+        write_pickle(cleaned, os.path.join(state_dir, name + '.cleaned.pkl'))
+        write_pickle(cells, os.path.join(state_dir, name + '.cube.pkl'))
+        watermark.update(cleaned=name + '.cleaned.pkl', cube=name + '.cube.pkl', rows=len(cleaned))
+
+    partial = None
+    still_writing = size is not None and os.path.getsize(file_path) != size
+    if remainder.strip() and not still_writing:
+        partial = parse_rows(file_path, header, remainder + b'\n', dict(watermark))
+    watermark['partial_bytes'] = len(remainder)
+
+    watermark['offset'] += len(complete)
+    watermark['window_hash'] = window_hash(file_path, watermark)
+    return watermark, partial
+
+def parse_rows(file_path, header, body, watermark):
+    # Cleaned rows of complete CSV lines under the file's header; None when the format is not recognised
+    if not body:
+        return pd.DataFrame()
+    bank_format, columns = sniff_format(header)
+    if bank_format is None:
+        logger.warning("Unknown file format: %s", file_path)
+        return None
+    raw = read_csv(io.BytesIO(header + body), bank_format, columns)
+    prepared = prepare_statement(raw, file_path, bank_format)
+    if prepared is None:
+        return None
+    if prepared.empty:
+        return pd.DataFrame()
+    watermark['last_date'] = str(prepared['Transaction Date'].max())
+    return clean_data(prepared)
+
+def combine_files(cleaned_frames):
+    if not cleaned_frames:
+        return pd.DataFrame(), None
+
+    # Match clean_data over the concatenated files: when any file carries a Category column,
+    # rows from files without one have no category rather than 'uncategorized'
+    any_category = any(watermark['has_category'] for watermark, _, _, _ in cleaned_frames)
+    frames = []
+    cells = None
+    for watermark, cleaned, file_cells, partial in cleaned_frames:
+        if partial is not None and not partial.empty:
+            # The unterminated last line is never persisted, only added for this run
+            cleaned = pd.concat([cleaned, partial], ignore_index=True)
+            file_cells = merge_cells(file_cells, cube_cells(partial))
+        if cleaned.empty:
+            continue
+        if any_category and not watermark['has_category']:
+            cleaned = cleaned.copy()
+            cleaned['Category'] = None
+            file_cells = file_cells.rename(index=lambda category: None, level='Category')
+        cells = merge_cells(cells, file_cells)
+        frames.append(cleaned)
+    if not frames:
+        return pd.DataFrame(), None
+
+    # Categoricals from different files only share a dtype once re-encoded over the combined values
+    data = compact_dtypes(pd.concat(frames, ignore_index=True))
+    return data, cells
+
+def is_append_of(file_path, size, watermark):
+    # The file is an append-only extension when it did not shrink and the consumed bytes look unchanged
+    if size < watermark['offset']:
+        return False
+    return window_hash(file_path, watermark) == watermark.get('window_hash')
+
+def window_hash(file_path, watermark):
+    # Hash the first and last CHECK_WINDOW bytes already consumed instead of the whole prefix
+    offset = watermark['offset']
+    digest = hashlib.sha256(watermark['header'].encode('utf-8'))
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(min(offset, CHECK_WINDOW)))
+        start = max(0, offset - CHECK_WINDOW)
+        f.seek(start)
+        digest.update(f.read(offset - start))
+    return digest.hexdigest()
+
+def file_key(file_path):
+    return hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:16]
+
+def write_pickle(value, path):
+    pd.to_pickle(value, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+def remove_unreferenced(state_dir, state):
+    # Pickles replaced by this run's writes, or left by an interrupted one
+    referenced = {watermark[key] for watermark in state.get('files', {}).values() for key in ('cleaned', 'cube') if key in watermark}
+    for name in os.listdir(state_dir):
+        if name.endswith(('.pkl', '.pkl.tmp')) and name not in referenced:
+            os.remove(os.path.join(state_dir, name))
+
+@contextmanager
+def state_lock(state_dir):
+    with open(os.path.join(state_dir, LOCK_FILE), 'w') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+def load_state(state_dir):
+    path = os.path.join(state_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        state = json.load(f)
+    if state.get('version') != STATE_VERSION:
+        logger.info("Incremental state in %s is from an older version, re-ingesting", state_dir)
+        return {}
+    return state
+
+def save_state(state_dir, state):
+    # Write to a temporary file first so an interrupted run never leaves a truncated state
+    state['version'] = STATE_VERSION
+    path = os.path.join(state_dir, STATE_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,217 @@
+# FILE: instrumentation.py
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from flask import Response, g, request
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak memory samples are skipped there
+    resource = None
+
+# Histogram bucket upper bounds in seconds, shared by stage and request timings
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+PROFILE_LINES = 40
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_counters = {}    # (name, labels) -> value
+_gauges = {}      # (name, labels) -> value
+_help = {
+    'budget_stage_duration_seconds': ('histogram', 'Time spent in each pipeline stage'),
+    'budget_stage_rows_in_total': ('counter', 'Rows entering each pipeline stage'),
+    'budget_stage_rows_out_total': ('counter', 'Rows leaving each pipeline stage'),
+    'budget_stage_rss_growth_bytes': ('gauge', 'Change in resident memory across each pipeline stage'),
+    'budget_stage_peak_traced_bytes': ('gauge', 'Peak Python heap allocated during each pipeline stage (TRACE_MEMORY only)'),
+    'budget_process_peak_rss_bytes': ('gauge', 'Process lifetime peak resident memory'),
+    'budget_request_duration_seconds': ('histogram', 'Flask request latency by route'),
+    'budget_result_cache_hits_total': ('counter', 'Analysis results served from the result cache'),
+    'budget_result_cache_misses_total': ('counter', 'Analysis results computed because the cache missed'),
+    'budget_result_cache_entries': ('gauge', 'Analysis results currently cached')
+}
+
+def configure_logging(default_level='WARNING'):
+    # LOG_LEVEL=DEBUG brings back the per-stage DataFrame previews; the default keeps them off the hot path
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', default_level).upper(), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def observe(name, value, **labels):
+    key = (name, label_key(labels))
+    with _lock:
+        buckets = _histograms.get(key)
+        if buckets is None:
+            buckets = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                buckets[i] += 1
+        buckets[-2] += 1
+        buckets[-1] += value
+
+def increment(name, value=1, **labels):
+    key = (name, label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[(name, label_key(labels))] = value
+
+def configure_memory_tracing():
+    # TRACE_MEMORY=1 traces Python allocations so each stage reports its own peak, as the benchmark does.
+    # Off by default: tracemalloc slows allocation-heavy stages down severalfold
+    if os.getenv('TRACE_MEMORY') and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def peak_rss_bytes():
+    # High-water mark for the whole process lifetime, so it only ever grows
+    if resource is None:
+        return None
+    # ru_maxrss is kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def current_rss_bytes():
+    # Resident memory right now; /proc is Linux only, elsewhere the stage RSS gauge is skipped
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+class StageRecord:
+    # Filled in by the caller inside a stage() block with the number of rows the stage produced
+    rows_out = None
+
+@contextmanager
+def stage(name, rows_in=None):
+    # Times one pipeline step and records its row counts and memory: the resident memory it added and, when
+    # tracing, the peak it allocated. Stages run one after another; a nested stage would reset the outer peak
+    record = StageRecord()
+    rss_before = current_rss_bytes()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        traced_before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        seconds = time.perf_counter() - start
+        observe('budget_stage_duration_seconds', seconds, stage=name)
+        if rows_in is not None:
+            increment('budget_stage_rows_in_total', rows_in, stage=name)
+        if record.rows_out is not None:
+            increment('budget_stage_rows_out_total', record.rows_out, stage=name)
+        rss_after = current_rss_bytes()
+        if rss_before is not None and rss_after is not None:
+            set_gauge('budget_stage_rss_growth_bytes', rss_after - rss_before, stage=name)
+        if tracing and tracemalloc.is_tracing():
+            set_gauge('budget_stage_peak_traced_bytes', tracemalloc.get_traced_memory()[1] - traced_before, stage=name)
+        logger.info("%s: %.4fs, rows in=%s out=%s", name, seconds, rows_in, record.rows_out)
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label_value(value)}"' for key, value in labels) + '}'
+
+def metrics_state():
+    # A picklable copy of every metric recorded in this process, for publishing to other processes
+    with _lock:
+        return {
+            'histograms': {key: list(value) for key, value in _histograms.items()},
+            'counters': dict(_counters),
+            'gauges': dict(_gauges)
+        }
+
+def render_metrics(cache=None, shared=None):
+    # Prometheus text exposition format; cache is cache_stats() from the result cache. shared is metrics_state()
+    # from another process (serve.py's refresher), whose histograms and counters are added to this process's
+    with _lock:
+        if cache is not None:
+            _counters[('budget_result_cache_hits_total', ())] = cache['hits']
+            _counters[('budget_result_cache_misses_total', ())] = cache['misses']
+            _gauges[('budget_result_cache_entries', ())] = cache['entries']
+        peak = peak_rss_bytes()
+        if peak is not None:
+            _gauges[('budget_process_peak_rss_bytes', ())] = peak
+        histograms = {key: list(value) for key, value in _histograms.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+    if shared is not None:
+        for key, buckets in shared['histograms'].items():
+            histograms[key] = [a + b for a, b in zip(histograms[key], buckets)] if key in histograms else list(buckets)
+        for key, value in shared['counters'].items():
+            if not key[0].startswith('budget_result_cache'):  # Already part of cache
+                counters[key] = counters.get(key, 0) + value
+        for key, value in shared['gauges'].items():
+            if not key[0].startswith('budget_result_cache'):
+                gauges.setdefault(key, value)
+    lines = []
+    for name, (kind, description) in _help.items():
+        samples = []
+        if kind == 'histogram':
+            for (metric, labels), buckets in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(LATENCY_BUCKETS, buckets):
+                    samples.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {count}")
+                samples.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {buckets[-2]}")
+                samples.append(f"{name}_sum{format_labels(labels)} {buckets[-1]}")
+                samples.append(f"{name}_count{format_labels(labels)} {buckets[-2]}")
+        else:
+            values = counters if kind == 'counter' else gauges
+            samples = [f"{name}{format_labels(labels)} {value}" for (metric, labels), value in sorted(values.items()) if metric == name]
+        if samples:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+    return '\n'.join(lines) + '\n'
+
+def profiling_requested():
+    # ?profile=1 profiles a single request, only when PROFILE_REQUESTS is set for this process
+    return bool(os.getenv('PROFILE_REQUESTS')) and request.args.get('profile') == '1'
+
+def init_app(app):
+    # Latency histogram for every route plus the optional per-request cProfile mode
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        if profiling_requested():
+            g.profiler = cProfile.Profile()
+            try:
+                g.profiler.enable()
+            except ValueError:  # Another request is already being profiled
+                g.profiler = None
+
+    @app.after_request
+    def record_request(response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            # The response is materialized inside the profile so streamed serialization is included
+            response.get_data()
+            profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_LINES)
+            response = Response(output.getvalue(), mimetype='text/plain')
+        start = g.pop('request_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            observe('budget_request_duration_seconds', time.perf_counter() - start, route=route, method=request.method, status=response.status_code)
+        return response
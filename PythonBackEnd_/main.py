@@ -1,15 +1,28 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import pandas as pd
 import os
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from utils import read_and_prepare_data
+import json
+from utils import read_and_prepare_data, memory_report
 from data_processing import clean_data, determine_recurring_charges, analyze_recurring_charges
-from analytics import identify_unique_spend_patterns
-from mappings import COLOR_PALETTE
+from analytics import calculate_z_scores, identify_unique_spend_patterns
+from categorization import categorize_cells, categorize_transactions, infer_categories
+from clustering import cluster_merchants
+from anomaly import get_detector
+from figures import get_figure
+from cache import get_or_compute, cache_stats
+from incremental import ingest_incremental
+from serialization import iter_data_response, gzip_stream, records_json
+from query import query_transactions, QueryError
+from aggregates import build_cube, get_cube
+from batch import list_accounts, load_account_result
+from worker import RefreshWorker, SnapshotFile
+from store import get_store, scoped_path
+from money import INTERNAL_COLUMNS, amount_cents, to_dollars
+from outliers import detect_outlier_months, outlier_cells, METHODS, DEFAULT_K, DEFAULT_MIN_SHARE
 from dotenv import load_dotenv
-import traceback
+import logging
+from instrumentation import configure_logging, configure_memory_tracing, init_app, stage, metrics_state, render_metrics, PROMETHEUS_CONTENT_TYPE
 
 # Load environment variables from .env file
 load_dotenv()
@@ -19,163 +32,365 @@ file_paths = [
     os.getenv('FILE_PATH_3'),
     os.getenv('FILE_PATH_4')
 ]
+# When set, statement files are ingested incrementally with watermarks kept in this directory
+incremental_state_dir = os.getenv('INCREMENTAL_STATE_DIR')
+# Directory of per-account results written by batch.py, served under /api/accounts
+batch_results_dir = os.getenv('BATCH_RESULTS_DIR')
+# When set, a background worker polls the statement files every this many seconds and recomputes on change
+refresh_interval = os.getenv('REFRESH_INTERVAL')
+refresh_worker = None
+# When set, cleaned transactions are kept in SQLite, one file per set of statement files named after this path
+# (see store.scoped_path), and the recurring, monthly spending and top-transaction queries run there
+transaction_db = os.getenv('TRANSACTION_DB')
+# Snapshot pickled by serve.py's refresher process and shared by every server worker process
+snapshot_path = os.getenv('SNAPSHOT_PATH')
+shared_snapshot = SnapshotFile(snapshot_path) if snapshot_path else None
+
+configure_logging()
+configure_memory_tracing()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
+init_app(app)  # Route latency histograms and ?profile=1
 
-def main():
-    print("File paths:", file_paths)  # Debugging statement to check file paths
-    data = read_and_prepare_data(file_paths)
-    
-    if data is None or data.empty:
-        print("Error: No data was read. Please check the file paths and the data files.")
-        return None, None, None, None
-    
-    print("Data after reading and preparing:", data.head())  # Debugging statement to check data
+def main(file_paths=file_paths):
+    logger.debug("File paths: %s", file_paths)
+    cube_cells = None
+    if incremental_state_dir:
+        # Only rows appended since the last run are parsed, cleaned and added to the aggregate cube
+        with stage('ingest_incremental') as record:
+            data, cube_cells = ingest_incremental(file_paths, incremental_state_dir)
+            record.rows_out = 0 if data is None else len(data)
+        if data is None or data.empty:
+            logger.error("No data was read. Please check the file paths and the data files.")
+            return None, None, None, None
+    else:
+        with stage('read_and_prepare_data') as record:
+            data = read_and_prepare_data(file_paths)
+            record.rows_out = 0 if data is None else len(data)
+        
+        if data is None or data.empty:
+            logger.error("No data was read. Please check the file paths and the data files.")
+            return None, None, None, None
+        
+        logger.debug("Data after reading and preparing:\n%s", data.head())
 
-    # Clean the data
-    data = clean_data(data)
-    print("Data after cleaning:", data.head())  # Debugging statement to check cleaned data
+        # Clean the data
+        with stage('clean_data', rows_in=len(data)) as record:
+            data = clean_data(data)
+            record.rows_out = len(data)
+    logger.debug("Data after cleaning:\n%s", data.head())
 
-    # Ensure 'Amount' column is treated as numerical data
-    data['Amount'] = pd.to_numeric(data['Amount'], errors='coerce')
-    print("Data with numerical Amount:", data.head())  # Debugging statement to check numerical Amount
+    # Infer categories for uncategorized rows (e.g. checking account exports) from their merchants
+    with stage('categorize_transactions', rows_in=len(data)):
+        inferred = infer_categories(data)
+        data = categorize_transactions(data, inferred)
+        # Incrementally maintained cube cells get the same merchant -> category fill instead of a rebuild
+        cube_cells = categorize_cells(cube_cells, inferred)
 
-    # Determine recurring charges
-    recurring_charges = determine_recurring_charges(data)
-    print("Recurring charges:", recurring_charges.head())  # Debugging statement to check recurring charges
-    recurring_charges_summary = analyze_recurring_charges(recurring_charges, data)
-    print("Recurring charges summary:", recurring_charges_summary)  # Debugging statement to check recurring charges summary
+    if os.getenv('MEMORY_REPORT'):
+        # An explicit opt-in, so logged at WARNING to show at the default level without LOG_LEVEL=INFO
+        logger.warning("Memory report:\n%s", memory_report(data))  # Per-column footprint of the typed frame vs Python objects
 
-    # Identify unique spend patterns
-    unique_spend_patterns = identify_unique_spend_patterns(data)
-    print("Unique spend patterns:", unique_spend_patterns.head())  # Debugging statement to check unique spend patterns
+    store = transaction_store(file_paths)
+    if store is not None:
+        with stage('store_load', rows_in=len(data)):
+            store.load(data)
 
-    # Calculate monthly spending data
-    data['date'] = pd.to_datetime(data['date'], errors='coerce')
-    monthly_spending_data = data.groupby([data['date'].dt.to_period('M'), 'Category'])['Amount'].sum().unstack()
-    monthly_spending_data.index = monthly_spending_data.index.astype(str)  # Convert Period to string
+    # Group near-duplicate merchant descriptions so a subscription billed under varying descriptors still forms one chain
+    with stage('cluster_merchants', rows_in=len(data)) as record:
+        merchant_clusters = cluster_merchants(data['Description'])
+        record.rows_out = len(merchant_clusters)
 
-    if monthly_spending_data.empty:
-        print("Error: No monthly spending data available.")
-        return None, None, None, None
-
-    print("Monthly spending data:", monthly_spending_data.head())  # Debugging statement to check monthly spending data
+    # Determine recurring charges
+    with stage('determine_recurring_charges', rows_in=len(data)) as record:
+        recurring_charges = store.recurring_charges(merchant_clusters) if store is not None else determine_recurring_charges(data, merchant_clusters)
+        record.rows_out = len(recurring_charges)
+    logger.debug("Recurring charges:\n%s", recurring_charges.head())
+    with stage('analyze_recurring_charges', rows_in=len(recurring_charges)):
+        recurring_charges_summary = analyze_recurring_charges(recurring_charges, data)
+    logger.debug("Recurring charges summary:\n%s", recurring_charges_summary)
 
-    # Ensure that the data is numerical
-    monthly_spending_data = monthly_spending_data.apply(pd.to_numeric, errors='coerce')
-    print("Monthly spending data with numerical values:", monthly_spending_data.head())  # Debugging statement to check numerical monthly spending data
+    # Identify unique spend patterns
+    with stage('identify_unique_spend_patterns', rows_in=len(data)) as record:
+        data = calculate_z_scores(data)
+        unique_spend_patterns = identify_unique_spend_patterns(data)
+        record.rows_out = len(unique_spend_patterns)
+    logger.debug("Unique spend patterns:\n%s", unique_spend_patterns.head())
 
-    # Handle NaN values by filling them with None
-    monthly_spending_data = monthly_spending_data.where(pd.notnull(monthly_spending_data), None).astype(object)
+    # Calculate monthly spending data from the month x category x merchant aggregate cube
+    with stage('monthly_spending', rows_in=len(data)) as record:
+        if store is not None:
+            monthly_spending_data = store.monthly_spending()
+        else:
+            cube = build_cube(data, cube_cells)
+            monthly_spending_data = cube.monthly_spending()
+        record.rows_out = len(monthly_spending_data)
 
-    # Calculate mean and standard deviation for each category manually
-    category_stats = monthly_spending_data.agg(['mean', 'std']).T
-    print("Category stats:", category_stats)  # Debugging statement to check category stats
-    if 'mean' not in category_stats.columns or 'std' not in category_stats.columns:
-        print("Error: Unable to calculate mean and standard deviation for categories.")
+    if monthly_spending_data.empty:
+        logger.error("No monthly spending data available.")
         return None, None, None, None
 
-    category_stats['threshold'] = category_stats['mean'] - 1.5 * category_stats['std']
-
-    # Set a minimum threshold value (15% of overall monthly volume)
-    minimum_threshold_percentage = 0.15
+    logger.debug("Monthly spending data:\n%s", monthly_spending_data.head())
 
     # Identify outlier months for each category
-    outlier_months = []
-    for month in monthly_spending_data.index:
-        overall_monthly_volume = abs(monthly_spending_data.loc[month].sum())
-        minimum_threshold_value = overall_monthly_volume * minimum_threshold_percentage
-        for category in monthly_spending_data.columns:
-            category_value = abs(monthly_spending_data.loc[month, category])
-            if category_value >= minimum_threshold_value:
-                category_threshold = category_stats.loc[category, 'threshold']
-                if monthly_spending_data.loc[month, category] < category_threshold:
-                    outlier_months.append((month, category))
+    with stage('detect_outlier_months', rows_in=len(monthly_spending_data)) as record:
+        outlier_months = detect_outlier_months(monthly_spending_data)
+        record.rows_out = len(outlier_months)
 
     # High-level summary of spending
-    total_spent = data['Amount'].sum()
-    total_recurring = recurring_charges['Amount'].sum()
-    total_unique_patterns = unique_spend_patterns['Amount'].sum()
-    unique_patterns_summary = unique_spend_patterns[['date', 'Description', 'Category', 'Amount']].to_string(index=False)
-    unique_patterns_by_category = unique_spend_patterns['Category'].value_counts().to_string()
-    summary = (
-        f"Total Spending: ${total_spent:.2f}\n"
-        f"Total Recurring Charges: ${total_recurring:.2f}\n"
-        f"{recurring_charges_summary}\n"
-        f"Total Unique Spend Patterns: ${total_unique_patterns:.2f}\n"
-        f"Unique Spend Patterns Details:\n{unique_patterns_summary}\n"
-        f"\nNumber of Unique Patterns by Category:\n{unique_patterns_by_category}\n"
-        f"Outlier Months: {len(outlier_months)}\n"
-    )
-    print(summary)
+    with stage('summary'):
+        # Totals are summed in integer cents and converted to dollars for display
+        total_spent = to_dollars(amount_cents(data).sum())
+        total_recurring = to_dollars(amount_cents(recurring_charges).sum())
+        total_unique_patterns = to_dollars(amount_cents(unique_spend_patterns).sum())
+        unique_patterns_summary = unique_spend_patterns[['date', 'Description', 'Category', 'Amount']].to_string(index=False)
+        unique_patterns_by_category = unique_spend_patterns['Category'].astype(object).value_counts().to_string()  # Only categories that occur
+        summary = (
+            f"Total Spending: ${total_spent:.2f}\n"
+            f"Total Recurring Charges: ${total_recurring:.2f}\n"
+            f"{recurring_charges_summary}\n"
+            f"Total Unique Spend Patterns: ${total_unique_patterns:.2f}\n"
+            f"Unique Spend Patterns Details:\n{unique_patterns_summary}\n"
+            f"\nNumber of Unique Patterns by Category:\n{unique_patterns_by_category}\n"
+            f"Outlier Months: {len(outlier_months)}\n"
+        )
+    logger.debug("Summary:\n%s", summary)
 
     return data, monthly_spending_data, outlier_months, summary
 
-def plot_transactions(transactions, title, color, row, xaxis_title):
-    if not transactions.empty:
-        bar_trace = go.Bar(x=transactions['Description'], y=transactions['Amount'], name=title, marker_color=color)
-        return bar_trace, row, xaxis_title
-    else:
-        return None, row, xaxis_title
+def transaction_store(file_paths=file_paths):
+    return get_store(scoped_path(transaction_db, file_paths)) if transaction_db else None
+
+def compute_analysis():
+    # Reuse the last analysis until one of the statement files or mapping tables changes
+    return get_or_compute(file_paths, lambda: main(file_paths))
+
+def cached_main():
+    # Serve the latest completed snapshot from the background worker (this process's, or the one shared by
+    # serve.py) when there is one; otherwise compute through the result cache
+    snapshot = refresh_worker.snapshot if refresh_worker is not None else None
+    if snapshot is None and shared_snapshot is not None:
+        snapshot = shared_snapshot.load()
+    if snapshot is not None:
+        return snapshot.result
+    return compute_analysis()
+
+def start_refresh_worker(poll_interval, publish=None):
+    global refresh_worker
+    if refresh_worker is None:
+        refresh_worker = RefreshWorker(file_paths, compute_analysis, poll_interval, publish=publish).start()
+    return refresh_worker
 
 @app.route('/api/data', methods=['GET'])
 def get_data():
     try:
-        data, monthly_spending_data, outlier_months, summary = main()
+        return data_response(cached_main())
+    except Exception as e:
+        logger.exception("Request to %s failed", request.path)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/accounts', methods=['GET'])
+def get_accounts():
+    if not batch_results_dir or not os.path.isdir(batch_results_dir):
+        return jsonify({'error': 'No batch results are configured. Set BATCH_RESULTS_DIR.'}), 404
+    return jsonify({'accounts': list_accounts(batch_results_dir)})
+
+@app.route('/api/accounts/<account_id>/data', methods=['GET'])
+def get_account_data(account_id):
+    try:
+        if not batch_results_dir:
+            return jsonify({'error': 'No batch results are configured. Set BATCH_RESULTS_DIR.'}), 404
+        result = load_account_result(batch_results_dir, account_id)
+        if result is None:
+            return jsonify({'error': f"No results for account '{account_id}'"}), 404
+        return data_response(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.exception("Request to %s failed", request.path)
+        return jsonify({'error': str(e)}), 500
+
+def data_response(result):
+    data, monthly_spending_data, outlier_months, summary = result
+    if data is None or monthly_spending_data is None:
+        return jsonify({'error': 'No data was read. Please check the file paths and the data files.'}), 400
+
+    if request.args.get('stream'):
+        # Encode records in chunks straight from the typed frame instead of building the whole response
+        chunks = iter_data_response(data, monthly_spending_data, outlier_months, summary)
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            return Response(gzip_stream(chunks), mimetype='application/json', headers={'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'})
+        return Response(chunks, mimetype='application/json', headers={'Vary': 'Accept-Encoding'})
+
+    # Replace NaN values with None (null in JSON)
+    data = data.drop(columns=INTERNAL_COLUMNS, errors='ignore')
+    data = data.astype(object).where(pd.notnull(data), None)
+    monthly_spending_data = monthly_spending_data.astype(object).where(pd.notnull(monthly_spending_data), None)
+
+    response = {
+        'data': data.to_dict(orient='records'),
+        'monthly_spending_data': monthly_spending_data.to_dict(orient='index'),
+        'outlier_months': outlier_months,
+        'summary': summary
+    }
+
+    logger.debug("Response: %d records", len(response['data']))
+
+    return jsonify(response)
+
+@app.route('/api/transactions', methods=['GET'])
+def get_transactions():
+    try:
+        data, monthly_spending_data, outlier_months, summary = cached_main()
+        if data is None:
+            return jsonify({'error': 'No data was read. Please check the file paths and the data files.'}), 400
+
+        # Filters: start, end, category, q, min_amount, max_amount; plus fields, sort, limit and cursor
+        transactions, page = query_transactions(data, request.args)
+        body = '{"data":' + records_json(transactions) + ',' + json.dumps(page)[1:]
+        return Response(body, mimetype='application/json')
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.exception("Request to %s failed", request.path)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/aggregates', methods=['GET'])
+def get_aggregates():
+    try:
+        data, monthly_spending_data, outlier_months, summary = cached_main()
+        if data is None:
+            return jsonify({'error': 'No data was read. Please check the file paths and the data files.'}), 400
+
+        # granularity: month, quarter or year; by: total, category or merchant
+        granularity = request.args.get('granularity', 'month')
+        by = request.args.get('by', 'category')
+        try:
+            rollup = get_cube(data).rollup(granularity, by)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if request.args.get('category') and 'Category' in rollup.columns:
+            rollup = rollup[rollup['Category'].isin(request.args['category'].lower().split(','))]
+        return Response(records_json(rollup), mimetype='application/json')
+    except Exception as e:
+        logger.exception("Request to %s failed", request.path)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/outliers', methods=['GET'])
+def get_outliers():
+    try:
+        data, monthly_spending_data, outlier_months, summary = cached_main()
         if data is None or monthly_spending_data is None:
             return jsonify({'error': 'No data was read. Please check the file paths and the data files.'}), 400
 
-        # Replace NaN values with None (null in JSON)
-        data = data.where(pd.notnull(data), None).astype(object)
-        monthly_spending_data = monthly_spending_data.where(pd.notnull(monthly_spending_data), None).astype(object)
+        # k: spread multiplier, min_share: minimum share of the month's volume, method: std or mad
+        method = request.args.get('method', 'std')
+        if method not in METHODS:
+            return jsonify({'error': f"Unknown outlier method '{method}'"}), 400
+        try:
+            k = float(request.args.get('k', DEFAULT_K))
+            min_share = float(request.args.get('min_share', DEFAULT_MIN_SHARE))
+        except ValueError:
+            return jsonify({'error': 'k and min_share must be numbers'}), 400
+        cells = outlier_cells(monthly_spending_data, k=k, min_share=min_share, method=method)
+        return Response(records_json(cells), mimetype='application/json')
+    except Exception as e:
+        logger.exception("Request to %s failed", request.path)
+        return jsonify({'error': str(e)}), 500
 
-        response = {
-            'data': data.to_dict(orient='records'),
-            'monthly_spending_data': monthly_spending_data.to_dict(orient='index'),
-            'outlier_months': outlier_months,
-            'summary': summary
-        }
+@app.route('/api/score', methods=['POST'])
+def score_transaction():
+    # Score one incoming transaction against its category's running statistics: {"category", "amount", "date"?}.
+    # Query parameters: alpha (0 < alpha <= 1) weights recent spending exponentially; window_months limits the
+    # statistics to that many months up to the transaction's. Scoring never changes the statistics: they are
+    # shared by every request and each server process holds its own, so new transactions reach them through
+    # the statement files at the next recompute
+    try:
+        data, monthly_spending_data, outlier_months, summary = cached_main()
+        if data is None:
+            return jsonify({'error': 'No data was read. Please check the file paths and the data files.'}), 400
 
-        print("Response:", response)  # Log the response
+        transaction = request.get_json(silent=True) or {}
+        if 'category' not in transaction or 'amount' not in transaction:
+            return jsonify({'error': 'category and amount are required'}), 400
+        try:
+            amount = float(transaction['amount'])
+            date = pd.Timestamp(transaction['date']) if transaction.get('date') else None
+        except (TypeError, ValueError):
+            return jsonify({'error': 'amount must be a number and date a valid date'}), 400
+        try:
+            alpha = float(request.args['alpha']) if request.args.get('alpha') else None
+            window_months = int(request.args['window_months']) if request.args.get('window_months') else None
+        except ValueError:
+            return jsonify({'error': 'alpha must be a number and window_months an integer'}), 400
+        if alpha is not None and not 0 < alpha <= 1:
+            return jsonify({'error': 'alpha must be greater than 0 and at most 1'}), 400
+        if window_months is not None and window_months < 1:
+            return jsonify({'error': 'window_months must be at least 1'}), 400
+        if alpha is not None and window_months is not None:
+            return jsonify({'error': 'alpha and window_months cannot be combined'}), 400
+        if 'update' in request.args:
+            return jsonify({'error': 'update is not supported; new transactions are scored against the statement files'}), 400
 
-        return jsonify(response)
+        score = get_detector(data, alpha=alpha, window_months=window_months).score(transaction['category'], amount, date)
+        return jsonify(score)
     except Exception as e:
-        print(traceback.format_exc())
+        logger.exception("Request to %s failed", request.path)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/plot', methods=['GET'])
 def get_plot():
     try:
-        data, monthly_spending_data, outlier_months, summary = main()
-        total_plots = len(outlier_months) + 1
-        vertical_spacing = min(0.024, 1 / (total_plots - 1))
-        fig = make_subplots(rows=total_plots, cols=1, shared_xaxes=False, vertical_spacing=vertical_spacing)
-        
-        for category in monthly_spending_data.columns:
-            fig.add_trace(go.Scatter(x=monthly_spending_data.index, y=monthly_spending_data[category], mode='lines+markers', name=category, line=dict(color=COLOR_PALETTE.get(category, 'grey'))), row=1, col=1)
-        
-        fig.update_layout(title='Monthly Spending Comparison', xaxis_title='Month', yaxis_title='Amount', legend_title='Category')
-
-        current_row = 2
-        for month, category in outlier_months:
-            top_transactions = data[(data['date'].dt.to_period('M').astype(str) == month) & (data['Category'] == category)].nsmallest(10, 'Amount')
-            color = COLOR_PALETTE.get(category, 'grey')
-            xaxis_title = f"{month} - {category}"
-            bar_trace, row, xaxis_title = plot_transactions(top_transactions, f'Top Transactions for {category} in {month}', color, current_row, xaxis_title)
-            if bar_trace:
-                fig.add_trace(bar_trace, row=row, col=1)
-                fig.update_xaxes(title_text=xaxis_title, row=row, col=1)
-                fig.update_yaxes(title_text='Amount', row=row, col=1)
-                current_row += 1
-        
-        fig.update_layout(height=300 * total_plots, showlegend=True, title_text="Monthly Spending and Outlier Transactions")
-        
-        # Return the data and layout directly
-        return jsonify({'data': fig.data, 'layout': fig.layout})
+        data, monthly_spending_data, outlier_months, summary = cached_main()
+        if data is None or monthly_spending_data is None:
+            return jsonify({'error': 'No data was read. Please check the file paths and the data files.'}), 400
+
+        # The serialized figure is built once per dataset; clients holding the same ETag get a 304
+        figure = get_figure(data, monthly_spending_data, outlier_months, transaction_store())
+        response = Response(figure.json(), mimetype='application/json')
+        response.set_etag(figure.etag())
+        return response.make_conditional(request)
     except Exception as e:
-        print(traceback.format_exc())
+        logger.exception("Request to %s failed", request.path)
         return jsonify({'error': str(e)}), 500
 
+def worker_metrics(status):
+    # Published with each snapshot by serve.py's refresher, the only process that runs the pipeline there
+    return {'metrics': metrics_state(), 'cache': cache_stats(), 'refresh': status}
+
+def refresher_metrics():
+    # The metrics the refresher process published with the shared snapshot, if this process reads one
+    if refresh_worker is not None or shared_snapshot is None:
+        return None
+    snapshot = shared_snapshot.load()
+    return None if snapshot is None else snapshot.metrics
+
+@app.route('/api/cache', methods=['GET'])
+def get_cache_stats():
+    stats = cache_stats()
+    if refresh_worker is not None:
+        stats['refresh'] = refresh_worker.status()
+    shared = refresher_metrics()
+    if shared is not None:
+        # As of the refresher's last published snapshot
+        stats['refresher'] = shared['cache']
+        stats['refresh'] = shared['refresh']
+    return jsonify(stats)
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    # Stage timings, row counts, peak memory, route latencies and result cache counters for Prometheus.
+    # Under serve.py the stage metrics and cache counters come from the refresher's last published snapshot
+    cache = cache_stats()
+    shared = refresher_metrics()
+    if shared is not None:
+        cache = {key: cache[key] + shared['cache'][key] for key in cache}
+    return Response(render_metrics(cache, shared and shared['metrics']), content_type=PROMETHEUS_CONTENT_TYPE)
+
 if __name__ == "__main__":
+    # Only in the reloader's serving process, not the parent process that watches the source files
+    if refresh_interval and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_refresh_worker(float(refresh_interval))
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,31 @@
+# FILE: money.py
+
+import math
+import numpy as np
+import pandas as pd
+
+# Exact int64 cents for every cleaned transaction; Amount stays alongside as the dollar view used for output
+CENTS_COLUMN = 'Cents'
+# Internal columns left out of JSON responses
+INTERNAL_COLUMNS = [CENTS_COLUMN]
+
+def to_cents(amounts):
+    # Round to the nearest cent once, so 19.99 becomes 1999 rather than 1998.9999...
+    cents = np.rint(np.asarray(amounts, dtype=float) * 100).astype(np.int64)
+    if isinstance(amounts, pd.Series):
+        return pd.Series(cents, index=amounts.index, name=CENTS_COLUMN)
+    return cents
+
+def to_dollars(cents):
+    return cents / 100
+
+def amount_cents(data):
+    # The cents column when the frame has been cleaned, otherwise converted from Amount
+    if CENTS_COLUMN in data.columns:
+        return data[CENTS_COLUMN]
+    return to_cents(data['Amount'])
+
+def bound_cents(amount, upper=False):
+    # A dollar filter bound as whole cents that keeps the same rows: amount >= min  <=>  cents >= ceil(min * 100)
+    cents = round(amount * 100, 6)
+    return math.floor(cents) if upper else math.ceil(cents)
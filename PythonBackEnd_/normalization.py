@@ -0,0 +1,68 @@
+# FILE: normalization.py
+
+import re
+import numpy as np
+import pandas as pd
+
+# Remove any * or # followed by non-whitespace characters and digits (invoice IDs, store numbers, ...)
+DESCRIPTION_NOISE = re.compile(r'\s*[\*#]\S+|\d+')
+
+# Raw description -> cleaned description, kept for the life of the process so repeat runs only clean new merchants
+_cleaned_descriptions = {}
+_matchers = {}
+
+def clean_descriptions(descriptions):
+    # Clean each distinct description once, in a single vectorized pass over the ones not seen before
+    codes, uniques = pd.factorize(descriptions)
+    unseen = [description for description in uniques if description not in _cleaned_descriptions]
+    if unseen:
+        cleaned = pd.Series(unseen, dtype=object).str.replace(DESCRIPTION_NOISE, '', regex=True).str.strip()
+        _cleaned_descriptions.update(zip(unseen, cleaned))
+    return expand(codes, [_cleaned_descriptions[description] for description in uniques], descriptions.index)
+
+def map_descriptions(descriptions, description_mapping):
+    # Resolve each distinct description against the mapping by longest whole-token prefix
+    matcher = get_matcher(description_mapping)
+    codes, uniques = pd.factorize(descriptions)
+    return expand(codes, [matcher.match(description) for description in uniques], descriptions.index)
+
+def expand(codes, unique_values, index):
+    values = np.empty(len(unique_values) + 1, dtype=object)
+    values[:-1] = unique_values
+    values[-1] = np.nan  # factorize marks missing values with code -1
+    return pd.Series(values.take(codes), index=index, dtype=object)
+
+def get_matcher(description_mapping):
+    key = tuple(sorted(description_mapping.items()))
+    matcher = _matchers.get(key)
+    if matcher is None:
+        matcher = _matchers[key] = DescriptionMatcher(description_mapping)
+    return matcher
+
+class DescriptionMatcher:
+    # Token trie over the mapping keys, so 'linkedin pre' also matches 'linkedin pre linkedin.com ca'
+    # while 'dd' does not match 'ddx'
+    VALUE = object()
+
+    def __init__(self, description_mapping):
+        self.root = {}
+        self.matches = {}
+        for key, value in description_mapping.items():
+            node = self.root
+            for token in key.split():
+                node = node.setdefault(token, {})
+            node[self.VALUE] = value
+
+    def match(self, description):
+        if description in self.matches:
+            return self.matches[description]
+        result = description
+        node = self.root
+        for token in description.split():
+            node = node.get(token)
+            if node is None:
+                break
+            if self.VALUE in node:
+                result = node[self.VALUE]
+        self.matches[description] = result
+        return result
@@ -0,0 +1,47 @@
+# FILE: outliers.py
+
+import numpy as np
+import pandas as pd
+
+# Default rule: a month x category cell is an outlier when it is more than 1.5 standard deviations
+# below the category's mean and accounts for at least 15% of that month's volume
+DEFAULT_K = 1.5
+DEFAULT_MIN_SHARE = 0.15
+METHODS = ['std', 'mad']
+MAD_SCALE = 1.4826  # Makes the median absolute deviation comparable to a standard deviation
+
+def category_thresholds(monthly_spending_data, k=DEFAULT_K, method='std'):
+    # Per-category lower bound: mean - k*std, or median - k*scaled MAD for the robust variant
+    if method == 'std':
+        center = monthly_spending_data.mean()
+        spread = monthly_spending_data.std()
+    elif method == 'mad':
+        center = monthly_spending_data.median()
+        spread = MAD_SCALE * (monthly_spending_data - center).abs().median()
+    else:
+        raise ValueError(f"Unknown outlier method '{method}'")
+    return pd.DataFrame({'center': center, 'spread': spread, 'threshold': center - k * spread})
+
+def outlier_cells(monthly_spending_data, k=DEFAULT_K, min_share=DEFAULT_MIN_SHARE, method='std'):
+    # Flag every month x category cell at once: threshold broadcast across months, share-of-month mask
+    stats = category_thresholds(monthly_spending_data, k, method)
+    values = monthly_spending_data.to_numpy(dtype=float)
+    monthly_volume = np.abs(monthly_spending_data.sum(axis=1).to_numpy(dtype=float))
+    with np.errstate(invalid='ignore'):
+        share_mask = np.abs(values) >= min_share * monthly_volume[:, None]
+        below_mask = values < stats['threshold'].to_numpy(dtype=float)[None, :]
+    rows, columns = np.nonzero(share_mask & below_mask)  # Row-major: months in order, then categories
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = np.abs(values[rows, columns]) / monthly_volume[rows]
+
+    return pd.DataFrame({
+        'month': monthly_spending_data.index[rows].astype(str),
+        'category': monthly_spending_data.columns[columns].astype(str),
+        'amount': values[rows, columns],
+        'threshold': stats['threshold'].to_numpy(dtype=float)[columns],
+        'share': shares
+    })
+
+def detect_outlier_months(monthly_spending_data, k=DEFAULT_K, min_share=DEFAULT_MIN_SHARE, method='std'):
+    cells = outlier_cells(monthly_spending_data, k, min_share, method)
+    return list(zip(cells['month'], cells['category']))
@@ -0,0 +1,152 @@
+# FILE: query.py
+
+import base64
+import hashlib
+import json
+import math
+import numpy as np
+import pandas as pd
+from money import INTERNAL_COLUMNS, amount_cents, bound_cents
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+SORTABLE_COLUMNS = ['date', 'Amount', 'Description', 'Category']
+
+_index = None
+
+class QueryError(ValueError):
+    pass
+
+class TransactionIndex:
+    # Lookup structures built once per cleaned dataset so queries avoid full scans
+
+    def __init__(self, data):
+        self.data = data
+        self.version = data_version(data)
+        dates = data['date'].to_numpy()
+        # Row positions ordered by date (NaT last) for range lookups with searchsorted
+        self.date_order = np.argsort(dates, kind='stable')
+        self.sorted_dates = dates[self.date_order]
+        self.category_rows = {str(category): rows for category, rows in data.groupby('Category', observed=True).indices.items()}
+        # Description substring search runs over distinct merchants, not rows
+        self.description_codes, self.descriptions = pd.factorize(data['Description'])
+        self.descriptions = pd.Series(self.descriptions, dtype=object).str.lower()
+        self.cents = amount_cents(data).to_numpy(dtype=np.int64)
+
+    def select(self, start=None, end=None, categories=None, text=None, min_amount=None, max_amount=None):
+        # Return row positions in date order matching every given filter
+        low = 0 if start is None else np.searchsorted(self.sorted_dates, start.to_datetime64(), side='left')
+        high = len(self.sorted_dates) if end is None else np.searchsorted(self.sorted_dates, end.to_datetime64(), side='right')
+        positions = self.date_order[low:high]
+
+        if categories:
+            in_categories = np.zeros(len(self.data), dtype=bool)
+            for category in categories:
+                in_categories[self.category_rows.get(category, [])] = True
+            positions = positions[in_categories[positions]]
+        if text:
+            matches = self.descriptions.str.contains(text.lower(), regex=False, na=False).to_numpy()
+            # factorize marks missing descriptions with -1, which never match
+            matches = np.append(matches, False)
+            positions = positions[matches[self.description_codes[positions]]]
+        if min_amount is not None:
+            positions = positions[self.cents[positions] >= bound_cents(min_amount)]
+        if max_amount is not None:
+            positions = positions[self.cents[positions] <= bound_cents(max_amount, upper=True)]
+        return positions
+
+    def order(self, positions, sort):
+        if not sort or sort == 'date':
+            return positions
+        descending = sort.startswith('-')
+        column = sort.lstrip('-')
+        if column not in SORTABLE_COLUMNS:
+            raise QueryError(f"Cannot sort by '{column}'")
+        if column == 'date':
+            return positions[::-1]
+        values = self.data[column].iloc[positions]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+        # pandas sorts missing values (checking rows have no Category) last instead of comparing them with strings
+        order = values.reset_index(drop=True).sort_values(ascending=not descending, kind='stable', na_position='last').index
+        return positions[order.to_numpy()]
+
+def data_version(data):
+    # Cursors carry a hash of the rows they page through rather than a per-process counter, so every worker
+    # serving the same data accepts them and one serving different data rejects them
+    values = data.astype({column: object for column in data.columns if isinstance(data[column].dtype, pd.CategoricalDtype)})
+    hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    return hashlib.sha1(hashes.tobytes()).hexdigest()[:16]
+
+def get_index(data):
+    # Rebuild only when the analysis result (and so the cleaned frame) changes
+    global _index
+    if _index is None or _index.data is not data:
+        _index = TransactionIndex(data)
+    return _index
+
+def query_transactions(data, args):
+    # Filter, sort, project and paginate transactions from request query parameters
+    index = get_index(data)
+    positions = index.select(
+        start=parse_date(args.get('start')),
+        end=parse_date(args.get('end')),
+        categories=[category.strip().lower() for category in args['category'].split(',')] if args.get('category') else None,
+        text=args.get('q'),
+        min_amount=parse_number(args.get('min_amount')),
+        max_amount=parse_number(args.get('max_amount'))
+    )
+    positions = index.order(positions, args.get('sort'))
+
+    limit = min(max(int(parse_number(args.get('limit')) or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+    offset = decode_cursor(args.get('cursor'), index.version)
+    page = positions[offset:offset + limit]
+    next_offset = offset + len(page)
+
+    frame = data.iloc[page]
+    if args.get('fields'):
+        fields = [field.strip() for field in args['fields'].split(',')]
+        missing = [field for field in fields if field not in data.columns or field in INTERNAL_COLUMNS]
+        if missing:
+            raise QueryError(f"Unknown fields: {', '.join(missing)}")
+        frame = frame[fields]
+
+    return frame, {
+        'total': int(len(positions)),
+        'next_cursor': encode_cursor(index.version, next_offset) if next_offset < len(positions) else None
+    }
+
+def parse_date(value):
+    if not value:
+        return None
+    try:
+        return pd.Timestamp(value)
+    except ValueError:
+        raise QueryError(f"Invalid date '{value}'")
+
+def parse_number(value):
+    if value is None or value == '':
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        raise QueryError(f"Invalid number '{value}'")
+    if not math.isfinite(number):
+        raise QueryError(f"Invalid number '{value}'")
+    return number
+
+def encode_cursor(version, offset):
+    return base64.urlsafe_b64encode(json.dumps({'v': version, 'o': offset}).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, version):
+    if not cursor:
+        return 0
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except ValueError:
+        raise QueryError("Invalid cursor")
+    if not isinstance(state, dict) or not isinstance(state.get('o'), int) or state['o'] < 0:
+        raise QueryError("Invalid cursor")
+    if state.get('v') != version:
+        raise QueryError("Cursor is from an older version of the data; restart pagination")
+    return state['o']
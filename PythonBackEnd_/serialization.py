@@ -0,0 +1,37 @@
+# FILE: serialization.py
+
+import json
+import zlib
+import pandas as pd
+from money import INTERNAL_COLUMNS
+
+RECORDS_CHUNK_SIZE = 5000
+# Same rendering Flask's jsonify uses for datetimes, so streamed and buffered responses match
+HTTP_DATE_FORMAT = '%a, %d %b %Y %H:%M:%S GMT'
+
+def iter_data_response(data, monthly_spending_data, outlier_months, summary, chunk_size=RECORDS_CHUNK_SIZE):
+    # Yield the /api/data JSON document piece by piece, encoding at most chunk_size records at a time
+    yield '{"data":['
+    for start in range(0, len(data), chunk_size):
+        records = records_json(data.iloc[start:start + chunk_size])
+        yield (',' if start else '') + records[1:-1]
+    yield '],"monthly_spending_data":' + monthly_spending_data.to_json(orient='index')
+    yield ',"outlier_months":' + json.dumps(outlier_months)
+    yield ',"summary":' + json.dumps(summary) + '}'
+
+def records_json(chunk):
+    # pandas' C encoder writes NaN/NaT as null, so no intermediate list of dicts is needed. Floats keep its
+    # default 10 decimal places: more prints binary noise (-30.63 as -30.629999999999999)
+    chunk = chunk.drop(columns=INTERNAL_COLUMNS, errors='ignore')
+    dates = [column for column in chunk.columns if pd.api.types.is_datetime64_any_dtype(chunk[column])]
+    if dates:
+        chunk = chunk.assign(**{column: chunk[column].dt.strftime(HTTP_DATE_FORMAT) for column in dates})
+    return chunk.to_json(orient='records')
+
+def gzip_stream(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode('utf-8'))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,99 @@
+# FILE: serve.py
+# Usage: python serve.py [--server gunicorn|waitress|werkzeug] [--workers N] [--threads N] [--host HOST] [--port PORT]
+# Production entry point for the API. One refresher process runs the analysis in the background and pickles each
+# completed snapshot to SNAPSHOT_PATH; the server's worker processes only read that snapshot, so requests never
+# run the pipeline and concurrent clients are spread over processes and threads instead of queuing on one.
+
+import argparse
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+SERVERS = ['gunicorn', 'waitress', 'werkzeug']
+FIRST_SNAPSHOT_TIMEOUT = 300  # Seconds to wait for the first analysis before serving anyway
+
+logger = logging.getLogger('serve')
+
+def default_server():
+    # gunicorn forks worker processes (POSIX only); waitress is a threaded server that also runs on Windows
+    for server in SERVERS[:-1]:
+        if server == 'gunicorn' and os.name == 'nt':
+            continue
+        try:
+            __import__(server)
+            return server
+        except ImportError:
+            pass
+    return 'werkzeug'
+
+def run_refresher(snapshot_path, poll_interval):
+    # Runs in its own process: watch the statement files and publish every completed analysis
+    import main
+    from worker import RefreshWorker, SnapshotFile
+    # Stage metrics, cache counters and refresh status travel with each snapshot, so every server worker's
+    # /api/metrics and /api/cache report the process that actually runs the pipeline
+    RefreshWorker(main.file_paths, main.compute_analysis, poll_interval, publish=SnapshotFile(snapshot_path).publish,
+                  collect_metrics=main.worker_metrics).run()
+
+def wait_for_snapshot(snapshot_path, refresher, timeout=FIRST_SNAPSHOT_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(snapshot_path) and refresher.is_alive() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    if not os.path.exists(snapshot_path):
+        logger.warning("No snapshot yet; requests will compute the analysis until the refresher publishes one")
+
+def serve_gunicorn(app, host, port, workers, threads):
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{host}:{port}")
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_class', 'gthread' if threads > 1 else 'sync')
+            self.cfg.set('timeout', 120)
+
+        def load(self):
+            return app
+
+    Application().run()
+
+def serve_waitress(app, host, port, workers, threads):
+    from waitress import serve
+    if workers > 1:
+        logger.warning("waitress runs a single process; using %d threads instead of %d workers", workers * threads, workers)
+    serve(app, host=host, port=port, threads=workers * threads)
+
+def serve_werkzeug(app, host, port, workers, threads):
+    logger.warning("Neither gunicorn nor waitress is installed; falling back to Werkzeug's threaded server")
+    app.run(host=host, port=port, threaded=True, debug=False, use_reloader=False)
+
+SERVE = {'gunicorn': serve_gunicorn, 'waitress': serve_waitress, 'werkzeug': serve_werkzeug}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the budget API with a background refresher and several workers.")
+    parser.add_argument('--server', choices=SERVERS, default=None, help="Default: gunicorn, else waitress, else werkzeug")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Server processes (gunicorn)")
+    parser.add_argument('--threads', type=int, default=4, help="Threads per server process")
+    parser.add_argument('--poll-interval', type=float, default=float(os.getenv('REFRESH_INTERVAL') or 2), help="Seconds between statement file checks")
+    args = parser.parse_args()
+
+    # Must be set before main is imported so every server process reads the shared snapshot
+    snapshot_path = os.environ.setdefault('SNAPSHOT_PATH', os.path.join(tempfile.gettempdir(), f"budget-snapshot-{args.port}.pkl"))
+    if os.path.exists(snapshot_path):
+        os.remove(snapshot_path)  # Never serve a previous run's analysis
+
+    from instrumentation import configure_logging
+    configure_logging('INFO')
+    refresher = multiprocessing.Process(target=run_refresher, args=(snapshot_path, args.poll_interval), name='refresher', daemon=True)
+    refresher.start()
+    wait_for_snapshot(snapshot_path, refresher)
+
+    from main import app
+    server = args.server or default_server()
+    logger.info("Serving on %s:%d with %s (%d workers x %d threads)", args.host, args.port, server, args.workers, args.threads)
+    SERVE[server](app, args.host, args.port, args.workers, args.threads)
@@ -0,0 +1,72 @@
+# FILE: statement_cache.py
+
+import logging
+import os
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow is optional; fall back to pickled frames
+    pa = None
+
+# Bump when the normalized statement layout changes so stale caches are rebuilt
+CACHE_VERSION = 2
+SIGNATURE_KEY = b'source_signature'
+
+logger = logging.getLogger(__name__)
+
+def cache_path(file_path):
+    return file_path + ('.feather' if pa is not None else '.pkl')
+
+def source_signature(file_path):
+    stat = os.stat(file_path)
+    return f"{CACHE_VERSION}:{stat.st_mtime_ns}:{stat.st_size}"
+
+def load_cached_statement(file_path):
+    # Return the parsed statement when a cache written for the current version of the source exists
+    path = cache_path(file_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        signature = source_signature(file_path)
+        if pa is not None:
+            table = feather.read_table(path, memory_map=True)
+            metadata = table.schema.metadata or {}
+            if metadata.get(SIGNATURE_KEY, b'').decode('utf-8') != signature:
+                return None
+            df = table.to_pandas()
+        else:
+            cached_signature, df = pd.read_pickle(path)
+            if cached_signature != signature:
+                return None
+    except Exception as e:
+        logger.warning("Error reading statement cache %s: %s", path, e)
+        return None
+    return df
+
+def save_cached_statement(file_path, df):
+    path = cache_path(file_path)
+    tmp_path = path + '.tmp'
+    try:
+        signature = source_signature(file_path)
+        df = to_cache_dtypes(df)
+        if pa is not None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), SIGNATURE_KEY: signature.encode('utf-8')})
+            # Uncompressed so later loads can memory-map the columns instead of decoding them
+            feather.write_feather(table, tmp_path, compression='uncompressed')
+        else:
+            pd.to_pickle((signature, df), tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning("Error writing statement cache %s: %s", path, e)
+
+def to_cache_dtypes(df):
+    # Store repetitive text columns (Description, Category, Type, ...) dictionary-encoded;
+    # dates and amounts are already datetime64/float64
+    df = df.copy()
+    for column in df.columns:
+        if pd.api.types.is_string_dtype(df[column]) and df[column].nunique() <= len(df) // 2:
+            df[column] = df[column].astype('category')
+    return df
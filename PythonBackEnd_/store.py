@@ -0,0 +1,200 @@
+# FILE: store.py
+
+import logging
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from data_processing import RECURRENCE_RULES, merge_cluster_charges
+from money import amount_cents, to_dollars
+from utils import input_set_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,          -- YYYY-MM-DD
+    month TEXT NOT NULL,         -- YYYY-MM, the same labels as the monthly spending index
+    month_index INTEGER NOT NULL,
+    description TEXT,            -- Cleaned, normalized merchant
+    category TEXT,
+    cents INTEGER NOT NULL,      -- Amount in whole cents
+    row_hash INTEGER NOT NULL,   -- Hash of (date, description, category, cents)
+    occurrence INTEGER NOT NULL  -- Numbers identical rows, so repeated same-day purchases stay distinct
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+# Stored in PRAGMA user_version; files written with an older schema are recreated. 3: row keys
+SCHEMA_VERSION = 3
+ROW_COLUMNS = ['date', 'Description', 'Category', 'Cents']
+INSERT_QUERY = ("INSERT INTO transactions (date, month, month_index, description, category, cents, row_hash, occurrence) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+# Row keys are always indexed: they are how load() finds the rows to add and remove
+KEY_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS transactions_key ON transactions (row_hash, occurrence)"
+# Seconds another process's load may hold the write lock before this one gives up
+BUSY_TIMEOUT = 60
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date)",
+    "CREATE INDEX IF NOT EXISTS transactions_category ON transactions (category, date)",
+    "CREATE INDEX IF NOT EXISTS transactions_description ON transactions (description, date, id)",
+    "CREATE INDEX IF NOT EXISTS transactions_month_category ON transactions (month, category, cents)"
+]
+INDEX_NAMES = ['transactions_date', 'transactions_category', 'transactions_description', 'transactions_month_category']
+
+# Each merchant's charges in date order with the gap in months and the amount change since its previous charge.
+# The merchant is the description, or with CLUSTER_SOURCE the representative of its near-duplicate cluster
+RECURRING_QUERY = """
+WITH ordered AS (
+    SELECT {merchant} AS merchant, cents,
+           month_index - LAG(month_index) OVER charges AS step,
+           ABS(cents - LAG(cents) OVER charges) AS change
+    FROM {source}
+    WHERE {merchant} IS NOT NULL
+    WINDOW charges AS (PARTITION BY {merchant} ORDER BY date, id)
+)
+SELECT merchant, COUNT(*), SUM(cents), MIN(step), MAX(step), MAX(change)
+FROM ordered
+GROUP BY merchant
+ORDER BY merchant
+"""
+CLUSTER_SOURCE = "transactions JOIN temp.merchant_clusters USING (description)"
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+class TransactionStore:
+    # Cleaned transactions in an embedded SQLite file, indexed for the queries main(), get_plot and
+    # extract_top_transactions need. One connection shared across threads, used under a lock
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            if self._connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                self._connection.execute("DROP TABLE IF EXISTS transactions")
+                self._connection.execute("DROP TABLE IF EXISTS meta")
+                self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._connection.executescript(SCHEMA)
+            for statement in INDEXES + [KEY_INDEX]:
+                self._connection.execute(statement)
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    def load(self, data):
+        # Bring the stored history in line with this cleaned frame, touching only the rows that differ: rows are
+        # keyed by content, so appended statement rows are inserted and rows no longer present (a rewritten export,
+        # a recategorized merchant) are deleted. Skipped when the same rows were loaded before
+        row_hash = pd.util.hash_pandas_object(data[ROW_COLUMNS].astype({'Description': object, 'Category': object}), index=False)
+        row_hash = pd.Series(row_hash.to_numpy().view(np.int64), index=data.index)  # SQLite integers are signed
+        occurrence = row_hash.groupby(row_hash.to_numpy()).cumcount()
+        fingerprint = f"{len(data)}:{int(row_hash.sum())}"
+        if self.query("SELECT value FROM meta WHERE key = 'fingerprint'") == [(fingerprint,)]:
+            return False
+
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock before reading the stored keys, so two processes loading the same
+            # file cannot both insert the same rows
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                stored = pd.DataFrame(self._connection.execute("SELECT id, row_hash, occurrence FROM transactions").fetchall(),
+                                      columns=['id', 'row_hash', 'occurrence'])
+                keys = pd.DataFrame({'row_hash': row_hash.to_numpy(), 'occurrence': occurrence.to_numpy(), 'position': np.arange(len(data))})
+                matched = keys.merge(stored, on=['row_hash', 'occurrence'], how='outer', indicator=True)
+                added = np.sort(matched.loc[matched['_merge'] == 'left_only', 'position'].to_numpy(dtype=np.int64))
+                removed = matched.loc[matched['_merge'] == 'right_only', 'id'].astype('int64').tolist()
+
+                # Indexes are rebuilt once after a bulk insert rather than maintained row by row
+                rebuild = len(added) > len(stored) - len(removed)
+                if rebuild:
+                    for name in INDEX_NAMES:
+                        self._connection.execute(f"DROP INDEX IF EXISTS {name}")
+                self._connection.executemany("DELETE FROM transactions WHERE id = ?", ((row_id,) for row_id in removed))
+                new_rows = data.iloc[added]
+                dates = new_rows['date']
+                self._connection.executemany(INSERT_QUERY, zip(
+                    dates.dt.strftime('%Y-%m-%d').tolist(),
+                    dates.dt.strftime('%Y-%m').tolist(),
+                    (dates.dt.year * 12 + dates.dt.month).tolist(),
+                    new_rows['Description'].astype(object).where(new_rows['Description'].notna(), None).tolist(),
+                    new_rows['Category'].astype(object).where(new_rows['Category'].notna(), None).tolist(),
+                    amount_cents(new_rows).astype('int64').tolist(),
+                    row_hash.iloc[added].tolist(),
+                    occurrence.iloc[added].tolist()
+                ))
+                if rebuild:
+                    for statement in INDEXES:
+                        self._connection.execute(statement)
+                self._connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)", (fingerprint,))
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("ANALYZE" if rebuild else "PRAGMA optimize")
+        logger.info("Store %s: %d rows added, %d removed", self.path, len(added), len(removed))
+        return True
+
+    def recurring_charges(self, clusters=None):
+        # Same result as data_processing.determine_recurring_charges: the first rule whose gap and amount tolerance
+        # every consecutive pair of a merchant's charges meets, compared in whole cents
+        recurring_charges = self.match_recurrence(self.query(RECURRING_QUERY.format(merchant='description', source='transactions')))
+        if clusters is None or clusters.empty:
+            return recurring_charges
+        # Clustered descriptions are joined to their cluster's representative through a temporary table
+        with self._lock:
+            self._connection.execute("CREATE TEMP TABLE IF NOT EXISTS merchant_clusters (description TEXT PRIMARY KEY, merchant TEXT)")
+            self._connection.execute("DELETE FROM temp.merchant_clusters")
+            self._connection.executemany("INSERT INTO temp.merchant_clusters VALUES (?, ?)", clusters.items())
+            rows = self._connection.execute(RECURRING_QUERY.format(merchant='merchant', source=CLUSTER_SOURCE)).fetchall()
+        return merge_cluster_charges(recurring_charges, self.match_recurrence(rows), clusters)
+
+    def match_recurrence(self, rows):
+        recurring = []
+        for description, count, total, min_step, max_step, max_change in rows:
+            for frequency, months, min_count, tolerance in RECURRENCE_RULES:
+                if count >= min_count and min_step == months and max_step == months and max_change <= tolerance:
+                    recurring.append((description, to_dollars(total), frequency))
+                    break
+        return pd.DataFrame(recurring, columns=['Description', 'Amount', 'Frequency'])
+
+    def monthly_spending(self):
+        # Same shape as AggregateCube.monthly_spending(): months as rows, categories as columns
+        rows = self.query(
+            "SELECT month, category, SUM(cents) FROM transactions "
+            "WHERE category IS NOT NULL GROUP BY month, category ORDER BY month, category")
+        sums = pd.DataFrame(rows, columns=['Month', 'Category', 'Cents'])
+        sums['Amount'] = to_dollars(sums['Cents'].astype('int64'))
+        return sums.pivot(index='Month', columns='Category', values='Amount')
+
+    def top_transactions(self, month, category, n=10, largest=False):
+        # Most negative (or, with largest, most positive) transactions of one month and category, read from the
+        # (month, category, cents) index
+        rows = self.query(
+            "SELECT date, description, category, cents FROM transactions WHERE month = ? AND category = ? "
+            f"ORDER BY cents {'DESC' if largest else 'ASC'}, id LIMIT ?", (month, category, n))
+        transactions = pd.DataFrame(rows, columns=['date', 'Description', 'Category', 'Cents'])
+        transactions['date'] = pd.to_datetime(transactions['date'])
+        transactions.insert(3, 'Amount', to_dollars(transactions['Cents'].astype('int64')))
+        return transactions
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+def scoped_path(path, file_paths):
+    # One database per set of statement files next to the configured path, so each input set (each batch.py
+    # account) only ever sees its own transactions
+    root, extension = os.path.splitext(path)
+    return f"{root}.{input_set_key(file_paths)}{extension or '.db'}"
+
+def get_store(path):
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = TransactionStore(path)
+        return _stores[path]
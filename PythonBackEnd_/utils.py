@@ -1,84 +1,186 @@
 import pandas as pd
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
 import os
 import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pandas.api.types import union_categoricals
+from normalization import map_descriptions
+from bank_formats import detect_format, sniff_format
+from statement_cache import load_cached_statement, save_cached_statement
 
-def read_and_prepare_data(file_paths):
-    data_frames = []
-    date_formats = ['%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y']  # List of possible date formats
+DATE_FORMATS = ['%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y']  # List of possible date formats
+# Files larger than this are split into chunks of about this size and parsed in worker processes
+PARALLEL_CHUNK_BYTES = 64 * 1024 * 1024
 
-    for file_path in file_paths:
-        print(f"Processing file: {file_path}")  # Debugging statement to check file paths
-        if not os.path.exists(file_path):
-            print(f"Error: File not found - {file_path}")
-            continue
-        try:
-            df = pd.read_csv(file_path)
-            print(f"Data read from {file_path}: {df.head()}")  # Debugging statement to check data read
-            if 'Posting Date' in df.columns:
-                # Process File Type 1
-                df = df.rename(columns={
-                    'Posting Date': 'Transaction Date',
-                    'Description': 'Description',
-                    'Amount': 'Amount',
-                    'Type': 'Type',
-                    'Balance': 'Balance',
-                    'Check or Slip #': 'Check or Slip #'
-                })
-            elif 'Transaction Date' in df.columns:
-                # Process File Type 2
-                df = df.rename(columns={
-                    'Transaction Date': 'Transaction Date',
-                    'Post Date': 'Post Date',
-                    'Description': 'Description',
-                    'Category': 'Category',
-                    'Type': 'Type',
-                    'Amount': 'Amount',
-                    'Memo': 'Memo'
-                })
-            else:
-                print(f"Unknown file format: {file_path}")
-                continue
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+except ImportError:  # pyarrow is optional; pandas' C parser is the fallback
+    CSV_ENGINE = 'c'
 
-            # Suppress warnings related to date parsing
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore", category=UserWarning)
-                for date_format in date_formats:
-                    try:
-                        df['Transaction Date'] = pd.to_datetime(df['Transaction Date'], format=date_format, errors='raise')
-                        break
-                    except ValueError:
-                        continue
-                df['Transaction Date'] = pd.to_datetime(df['Transaction Date'], errors='coerce')
-            
-            df = df.dropna(subset=['Transaction Date'])  # Drop rows with invalid dates
-
-            # Ensure 'Amount' column is treated as numerical data
-            df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce')
-
-            data_frames.append(df)
-        except Exception as e:
-            print(f"Error reading {file_path}: {e}")
+def input_set_key(file_paths):
+    # Short stable name for a set of statement files, for state kept per input set (each batch.py account)
+    scope = json.dumps([os.path.abspath(file_path) for file_path in file_paths if file_path])
+    return hashlib.sha1(scope.encode('utf-8')).hexdigest()[:16]
+
+def read_and_prepare_data(file_paths, max_workers=None):
+    # Statement files are read concurrently; pyarrow's CSV parser releases the GIL while parsing
+    with ThreadPoolExecutor(max_workers=max_workers or min(len(file_paths), os.cpu_count() or 1) or 1) as executor:
+        data_frames = [df for df in executor.map(read_statement_file, file_paths) if df is not None]
     
     if data_frames:
         # Filter out empty DataFrames before concatenation
         data_frames = [df for df in data_frames if not df.empty]
         if data_frames:
-            combined_data = pd.concat(data_frames, ignore_index=True)
-            print(f"Combined data: {combined_data.head()}")  # Debugging statement to check combined data
+            combined_data = concat_statements(data_frames)
+            logger.debug("Combined data:\n%s", combined_data.head())
             return combined_data
     return pd.DataFrame()  # Return an empty DataFrame instead of None
 
+def read_statement_file(file_path):
+    logger.debug("Processing file: %s", file_path)
+    if not file_path or not os.path.exists(file_path):
+        logger.error("File not found - %s", file_path)
+        return None
+    try:
+        return read_statement(file_path)
+    except Exception as e:
+        logger.error("Error reading %s: %s", file_path, e)
+        return None
+
+def read_statement(file_path):
+    # Load the typed statement from its columnar cache when the source is unchanged, otherwise parse the CSV
+    df = load_cached_statement(file_path)
+    if df is not None:
+        logger.debug("Data loaded from cache for %s", file_path)
+        return df
+    bank_format, header = sniff_format(file_path)
+    if bank_format is None:
+        logger.warning("Unknown file format: %s", file_path)
+        return None
+    if os.path.getsize(file_path) > PARALLEL_CHUNK_BYTES:
+        df = read_statement_chunks(file_path, bank_format, header)
+    else:
+        df = prepare_statement(read_csv(file_path, bank_format, header), file_path, bank_format)
+    logger.debug("Data read from %s:\n%s", file_path, None if df is None else df.head())
+    if df is not None:
+        save_cached_statement(file_path, df)
+    return df
+
+def read_csv(source, bank_format, header):
+    # Read only the columns the format declares, with its dtypes; retry without dtypes if a value does not fit
+    kwargs = bank_format.read_kwargs(header)
+    if CSV_ENGINE == 'pyarrow':
+        try:
+            return pd.read_csv(source, engine='pyarrow', **kwargs)
+        except Exception:
+            if hasattr(source, 'seek'):
+                source.seek(0)
+    try:
+        return pd.read_csv(source, **kwargs)
+    except ValueError:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        return pd.read_csv(source, usecols=kwargs['usecols'])
+
+def read_statement_chunks(file_path, bank_format, header):
+    # Split a large file into newline-aligned byte ranges that are parsed and prepared in worker processes
+    with open(file_path, 'rb') as f:
+        f.readline()  # The header is prepended to every chunk
+        boundaries = [f.tell()]
+        size = os.path.getsize(file_path)
+        while boundaries[-1] < size:
+            f.seek(min(boundaries[-1] + PARALLEL_CHUNK_BYTES, size))
+            f.readline()
+            boundaries.append(min(f.tell(), size))
+    ranges = list(zip(boundaries[:-1], boundaries[1:]))
+    # Workers are spawned rather than forked: this runs on a request or refresh thread, and forking a
+    # multi-threaded process can deadlock on locks held by the other threads
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(len(ranges), os.cpu_count() or 1), mp_context=context) as executor:
+        chunks = list(executor.map(read_statement_chunk, [file_path] * len(ranges), [bank_format] * len(ranges), [header] * len(ranges), ranges))
+    if any(chunk is None for chunk in chunks):
+        return None
+    return concat_statements(chunks)
+
+def read_statement_chunk(file_path, bank_format, header, byte_range):
+    start, end = byte_range
+    with open(file_path, 'rb') as f:
+        header_line = f.readline()
+        f.seek(start)
+        content = f.read(end - start)
+    return prepare_statement(read_csv(io.BytesIO(header_line + content), bank_format, header), file_path, bank_format)
+
+def concat_statements(data_frames):
+    # Give every frame the same columns and categorical dtypes up front, so pd.concat keeps the
+    # categoricals from cached statements instead of re-materializing them as strings
+    columns = list(dict.fromkeys(column for df in data_frames for column in df.columns))
+    categorical = {}
+    for column in columns:
+        present = [df[column] for df in data_frames if column in df.columns]
+        if all(isinstance(series.dtype, pd.CategoricalDtype) for series in present):
+            categories = union_categoricals([series.array for series in present], sort_categories=True).categories
+            categorical[column] = pd.CategoricalDtype(categories)
+    if categorical and len(data_frames) > 1:
+        data_frames = [df.reindex(columns=columns).astype(categorical) for df in data_frames]
+    return pd.concat(data_frames, ignore_index=True)
+
+def prepare_statement(df, file_path, bank_format=None):
+    # Normalize a raw statement frame to the common layout, or return None for unknown formats
+    if bank_format is None:
+        bank_format = detect_format(list(df.columns))
+    if bank_format is None:
+        logger.warning("Unknown file format: %s", file_path)
+        return None
+    df = df.rename(columns=bank_format.rename_map())
+    date_formats = [bank_format.date_format] + [date_format for date_format in DATE_FORMATS if date_format != bank_format.date_format]
+
+    # Suppress warnings related to date parsing
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=UserWarning)
+        for date_format in date_formats:
+            try:
+                df['Transaction Date'] = pd.to_datetime(df['Transaction Date'], format=date_format, errors='raise')
+                break
+            except ValueError:
+                continue
+        df['Transaction Date'] = pd.to_datetime(df['Transaction Date'], errors='coerce')
+    
+    df = df.dropna(subset=['Transaction Date'])  # Drop rows with invalid dates
+
+    # Ensure 'Amount' column is treated as numerical data
+    df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce')
+    return df
+
 def filter_and_group_data(data, category):
     filtered_data = data[data['Category'] == category]
     grouped_data = filtered_data.groupby(['Transaction Date', 'Description'])['Amount'].sum().reset_index()
     return grouped_data
 
-def extract_top_transactions(data, month, category, top_n=5):
+def extract_top_transactions(data, month, category, top_n=5, store=None):
+    if store is not None:
+        # Indexed lookup in the SQLite store instead of scanning the frame
+        return store.top_transactions(str(month), category, top_n, largest=True)
     monthly_data = data[(data['Transaction Date'].dt.to_period('M') == month) & (data['Category'] == category)]
     top_transactions = monthly_data.nlargest(top_n, 'Amount')
     return top_transactions
 
+def memory_report(data):
+    # Per-column footprint of the typed frame next to the same data held as Python objects
+    report = pd.DataFrame({
+        'object_bytes': data.astype(object).memory_usage(deep=True, index=False),
+        'typed_bytes': data.memory_usage(deep=True, index=False)
+    })
+    report.loc['total'] = report.sum()
+    return report
+
 def standardize_descriptions(data, description_mapping):
     data['Description'] = data['Description'].str.lower().str.strip()
-    data['Description'] = data['Description'].replace(description_mapping)
+    data['Description'] = map_descriptions(data['Description'], description_mapping)
     return data
\ No newline at end of file
@@ -0,0 +1,144 @@
+# FILE: worker.py
+
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+import pandas as pd
+
+POLL_INTERVAL = 2.0      # Seconds between checks of the statement files
+DEBOUNCE_SECONDS = 1.0   # Files must be unchanged this long before recomputing, so half-written exports are skipped
+
+logger = logging.getLogger(__name__)
+
+# A completed analysis: result is main()'s (data, monthly_spending_data, outlier_months, summary). metrics is
+# what the worker's collect_metrics returned when it was published, for processes that only read the snapshot
+Snapshot = namedtuple('Snapshot', ['version', 'result', 'file_stats', 'completed_at', 'seconds', 'metrics'], defaults=[None])
+
+def file_stats(file_paths):
+    # Cheap change detection: size and mtime only; content hashing is left to the result cache
+    stats = []
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path) if file_path else None
+        except OSError:
+            stat = None
+        stats.append((file_path, None if stat is None else stat.st_mtime_ns, None if stat is None else stat.st_size))
+    return tuple(stats)
+
+class RefreshWorker:
+    # Watches the statement files from a background thread and recomputes the analysis off the request path.
+    # Routes read `snapshot`, which is replaced in one assignment once a recompute has fully finished
+
+    def __init__(self, file_paths, compute, poll_interval=POLL_INTERVAL, debounce=DEBOUNCE_SECONDS, publish=None, collect_metrics=None):
+        self.file_paths = file_paths
+        self.compute = compute
+        self.publish = publish  # Called with each new snapshot, e.g. SnapshotFile.publish to share it with other processes
+        self.collect_metrics = collect_metrics  # Called with this worker's status; the result travels in the snapshot
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.snapshot = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._computed_stats = None
+        self._pending_stats = None
+        self._changed_at = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name='refresh-worker', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self):
+        self.refresh()
+        while not self._stop.wait(self.poll_interval):
+            self.poll()
+
+    def poll(self):
+        # Recompute once the files differ from the last snapshot and have stopped changing
+        stats = file_stats(self.file_paths)
+        now = time.monotonic()
+        if stats != self._pending_stats:
+            self._pending_stats, self._changed_at = stats, now
+        elif stats != self._computed_stats and now - self._changed_at >= self.debounce:
+            self.refresh(stats)
+
+    def refresh(self, stats=None):
+        # Single flight: a refresh requested while one is running is dropped, the next poll picks up any later change
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            stats = stats or file_stats(self.file_paths)
+            start = time.perf_counter()
+            try:
+                result = self.compute()
+            except Exception:
+                logger.exception("Background refresh failed; still serving snapshot %s", self.snapshot and self.snapshot.version)
+                return False
+            finally:
+                # A failing input is not retried on every poll, only after the files change again
+                self._computed_stats = stats
+            version = 1 if self.snapshot is None else self.snapshot.version + 1
+            snapshot = Snapshot(version, result, stats, time.time(), time.perf_counter() - start)
+            if self.collect_metrics is not None:
+                snapshot = snapshot._replace(metrics=self.collect_metrics(snapshot_status(snapshot, running=True, refreshing=False)))
+            if self.publish is not None:
+                self.publish(snapshot)
+            self.snapshot = snapshot
+            logger.info("Snapshot %d ready in %.2fs", version, snapshot.seconds)
+            return True
+        finally:
+            self._refresh_lock.release()
+
+    def wait_for_snapshot(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.snapshot is None and (deadline is None or time.monotonic() < deadline):
+            time.sleep(0.05)
+        return self.snapshot
+
+    def status(self):
+        return snapshot_status(self.snapshot, self._thread is not None and self._thread.is_alive(), self._refresh_lock.locked())
+
+def snapshot_status(snapshot, running, refreshing):
+    return {
+        'running': running,
+        'refreshing': refreshing,
+        'version': None if snapshot is None else snapshot.version,
+        'completed_at': None if snapshot is None else snapshot.completed_at,
+        'seconds': None if snapshot is None else round(snapshot.seconds, 4)
+    }
+
+class SnapshotFile:
+    # A snapshot pickled to disk so several server processes share one background worker's results.
+    # Writers replace the file atomically; readers unpickle it again only when its mtime changes
+
+    def __init__(self, path):
+        self.path = path
+        self._loaded = None
+        self._lock = threading.Lock()
+
+    def publish(self, snapshot):
+        pd.to_pickle(snapshot, self.path + '.tmp')
+        os.replace(self.path + '.tmp', self.path)
+
+    def load(self):
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        loaded = self._loaded
+        if loaded is not None and loaded[0] == mtime_ns:
+            return loaded[1]
+        with self._lock:
+            if self._loaded is None or self._loaded[0] != mtime_ns:
+                self._loaded = (mtime_ns, pd.read_pickle(self.path))
+            return self._loaded[1]